@@ -0,0 +1,188 @@
+"""
+Technical indicator kernels for the Stock Prediction ML API
+Operate on float64 numpy arrays and reproduce the `ta` library defaults
+(leading values are NaN until the window is full)
+"""
+
+import numpy as np
+
+from utils import njit
+
+
+@njit(cache=True)
+def rsi_wilder(close, n=14):
+    """Relative Strength Index with Wilder smoothing (alpha = 1/n)"""
+    size = close.shape[0]
+    out = np.full(size, np.nan)
+    alpha = 1.0 / n
+    avg_up = 0.0
+    avg_down = 0.0
+
+    for i in range(size):
+        diff = close[i] - close[i - 1] if i > 0 else 0.0
+        up = diff if diff > 0 else 0.0
+        down = -diff if diff < 0 else 0.0
+
+        if i == 0:
+            avg_up = up
+            avg_down = down
+        else:
+            avg_up = (1.0 - alpha) * avg_up + alpha * up
+            avg_down = (1.0 - alpha) * avg_down + alpha * down
+
+        if i >= n - 1:
+            out[i] = 100.0 if avg_down == 0 else 100.0 - 100.0 / (1.0 + avg_up / avg_down)
+
+    return out
+
+
+@njit(cache=True)
+def ema(x, n):
+    """Exponential moving average (span=n, adjust=False), weighting NaN gaps like pandas ewm(ignore_na=False)"""
+    size = x.shape[0]
+    out = np.full(size, np.nan)
+    alpha = 2.0 / (n + 1.0)
+    value = np.nan
+    old_wt = 1.0
+    nobs = 0
+
+    for i in range(size):
+        if nobs > 0:
+            old_wt *= 1.0 - alpha  # Keeps decaying across NaN gaps
+        if x[i] == x[i]:  # not NaN
+            value = x[i] if nobs == 0 else (old_wt * value + alpha * x[i]) / (old_wt + alpha)
+            old_wt = 1.0
+            nobs += 1
+        if nobs >= n:
+            out[i] = value
+
+    return out
+
+
+@njit(cache=True)
+def macd_fused(close, span_fast=12, span_slow=26, span_signal=9):
+    """EMA fast/slow, MACD, signal and histogram in a single pass over close (NaN gaps weighted as in ema)"""
+    size = close.shape[0]
+    ema_fast = np.full(size, np.nan)
+    ema_slow = np.full(size, np.nan)
+    macd = np.full(size, np.nan)
+    signal = np.full(size, np.nan)
+    hist = np.full(size, np.nan)
+    alpha_fast = 2.0 / (span_fast + 1.0)
+    alpha_slow = 2.0 / (span_slow + 1.0)
+    alpha_signal = 2.0 / (span_signal + 1.0)
+    macd_start = max(span_fast, span_slow)
+    fast = np.nan
+    slow = np.nan
+    sig = np.nan
+    old_wt_fast = 1.0
+    old_wt_slow = 1.0
+    nobs = 0
+    nobs_signal = 0
+
+    for i in range(size):
+        if nobs > 0:
+            old_wt_fast *= 1.0 - alpha_fast
+            old_wt_slow *= 1.0 - alpha_slow
+        if close[i] == close[i]:  # not NaN
+            if nobs == 0:
+                fast = close[i]
+                slow = close[i]
+            else:
+                fast = (old_wt_fast * fast + alpha_fast * close[i]) / (old_wt_fast + alpha_fast)
+                slow = (old_wt_slow * slow + alpha_slow * close[i]) / (old_wt_slow + alpha_slow)
+            old_wt_fast = 1.0
+            old_wt_slow = 1.0
+            nobs += 1
+
+        if nobs >= span_fast:
+            ema_fast[i] = fast
+        if nobs >= span_slow:
+            ema_slow[i] = slow
+        if nobs >= macd_start:
+            value = fast - slow
+            sig = value if nobs_signal == 0 else (1.0 - alpha_signal) * sig + alpha_signal * value
+            nobs_signal += 1
+            macd[i] = value
+            if nobs_signal >= span_signal:
+                signal[i] = sig
+                hist[i] = value - sig
+
+    return ema_fast, ema_slow, macd, signal, hist
+
+
+@njit(cache=True)
+def move_mean(x, w):
+    """Moving mean over w periods via a running sum; NaN unless the window is full"""
+    size = x.shape[0]
+    out = np.full(size, np.nan)
+    total = 0.0
+    nobs = 0
+
+    for i in range(size):
+        if x[i] == x[i]:  # not NaN
+            total += x[i]
+            nobs += 1
+        if i >= w and x[i - w] == x[i - w]:
+            total -= x[i - w]
+            nobs -= 1
+        if nobs >= w:
+            out[i] = total / nobs
+
+    return out
+
+
+@njit(cache=True)
+def bbands(close, n=20, k=2.0):
+    """Bollinger Bands (upper, middle, lower) with population standard deviation; NaN unless the window is full"""
+    size = close.shape[0]
+    upper = np.full(size, np.nan)
+    middle = np.full(size, np.nan)
+    lower = np.full(size, np.nan)
+    total = 0.0
+    total_sq = 0.0
+    nobs = 0
+
+    for i in range(size):
+        if close[i] == close[i]:  # not NaN
+            total += close[i]
+            total_sq += close[i] * close[i]
+            nobs += 1
+        if i >= n and close[i - n] == close[i - n]:
+            total -= close[i - n]
+            total_sq -= close[i - n] * close[i - n]
+            nobs -= 1
+        if nobs >= n:
+            mean = total / nobs
+            std = np.sqrt(max(total_sq / nobs - mean * mean, 0.0))
+            upper[i] = mean + k * std
+            middle[i] = mean
+            lower[i] = mean - k * std
+
+    return upper, middle, lower
+
+
+@njit(cache=True)
+def stoch(high, low, close, n=14):
+    """Stochastic oscillator %K over the trailing n-period high/low range"""
+    size = close.shape[0]
+    out = np.full(size, np.nan)
+
+    for i in range(n - 1, size):
+        lowest = low[i]
+        highest = high[i]
+        for j in range(i - n + 1, i):
+            lowest = min(lowest, low[j])
+            highest = max(highest, high[j])
+        if highest > lowest:
+            out[i] = 100.0 * (close[i] - lowest) / (highest - lowest)
+
+    return out
+
+
+def roc(close, n=12):
+    """Rate of change in percent over n periods"""
+    out = np.full(close.shape[0], np.nan)
+    if n < close.shape[0]:
+        out[n:] = (close[n:] - close[:-n]) / close[:-n] * 100
+    return out
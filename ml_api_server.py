@@ -1,68 +1,164 @@
+import functools
+import os
+import threading
+import time
 import warnings
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import numpy as np
 import pandas as pd
-import ta
 import yfinance as yf
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, url_for
+from flask_compress import Compress
 from flask_cors import CORS
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.model_selection import StratifiedShuffleSplit
 from sklearn.preprocessing import StandardScaler
 
+import indicators
+from utils import OrjsonProvider, TTLCache
+
+try:
+    import onnxruntime
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+except ImportError:  # ONNX export is optional; predictions then go through sklearn
+    onnxruntime = None
+
 warnings.filterwarnings('ignore')
 
+# Intervals that are served with timestamps instead of plain dates
+INTRADAY_INTERVALS = ('1m', '5m', '15m', '30m', '1h')
+
+# Downloaded price history is reused within the same hour (5 minutes for intraday)
+DAILY_CACHE_SECONDS = 3600
+INTRADAY_CACHE_SECONDS = 300
+
+# Concurrent yfinance downloads; identical in-flight requests share one download
+DOWNLOAD_WORKERS = 8
+
+# Model backends selectable through the model_type field of /api/predict
+MODEL_TYPES = ('Gradient Boosting', 'Random Forest')
+DEFAULT_MODEL_TYPE = 'Gradient Boosting'
+
+# Trained models are kept per symbol and retrained once a day
+MODEL_CACHE_SIZE = 64
+MODEL_MAX_AGE_SECONDS = 24 * 3600
+TRAINING_WORKERS = 2
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)  # orjson for every jsonify() response
 CORS(app)  # Enable CORS for React frontend
+Compress(app)  # gzip/brotli for responses over 500 bytes
+
+def last_row_values(data):
+    """Last row of a DataFrame as a plain {column: value} dict"""
+    row = data.iloc[-1]
+    return dict(zip(row.index, row.to_numpy()))
+
+def indicator_value(values, key, ndigits=None):
+    """Float (optionally rounded) for key, or None when missing or NaN"""
+    v = values.get(key)
+    if v is None or v != v:
+        return None
+    return float(v) if ndigits is None else round(float(v), ndigits)
+
+def json_column(values, ndigits):
+    """Rounded column as a list for JSON, with NaN entries replaced by None"""
+    rounded = np.round(np.asarray(values, dtype=np.float64), ndigits)
+    column = rounded.tolist()
+    for i in np.flatnonzero(np.isnan(rounded)).tolist():
+        column[i] = None
+    return column
 
 class StockPredictor:
     def __init__(self):
-        self.model = None
-        self.scaler = StandardScaler()
-        self.is_trained = False
+        # (symbol, model_type) -> (model, scaler, feature_columns, feature_positions, trained_at, onnx_session)
+        self._models = TTLCache(maxsize=MODEL_CACHE_SIZE, ttl=MODEL_MAX_AGE_SECONDS)
+        self._data_cache = TTLCache(maxsize=256, ttl=DAILY_CACHE_SECONDS)
+        
+        # Downloads run on a shared pool; concurrent requests for the same key wait on one future
+        self._io_pool = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS)
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        
+        # Background training jobs, one in flight per (symbol, model_type)
+        self._train_pool = ThreadPoolExecutor(max_workers=TRAINING_WORKERS)
+        self._training_futures = {}
+        self._training_lock = threading.Lock()
         
     def download_stock_data(self, symbol, period='2y', interval='1d'):
-        """Download stock data using yfinance"""
-        try:
-            stock = yf.Ticker(symbol)
-            data = stock.history(period=period, interval=interval)
-            return data
-        except Exception as e:
-            print(f"Error downloading data for {symbol}: {e}")
-            return None
+        """Download stock data using yfinance (cached per symbol, period and interval)"""
+        bucket_seconds = INTRADAY_CACHE_SECONDS if interval in INTRADAY_INTERVALS else DAILY_CACHE_SECONDS
+        cache_key = (symbol.upper(), period, interval, int(time.time() // bucket_seconds))
+        
+        data = self._data_cache.get(cache_key)
+        if data is None:
+            with self._inflight_lock:
+                future = self._inflight.get(cache_key)
+                owner = future is None
+                if owner:
+                    future = self._io_pool.submit(self._fetch_history, symbol, period, interval)
+                    self._inflight[cache_key] = future
+            
+            try:
+                data = future.result()
+                if owner and data is not None and not data.empty:
+                    self._data_cache.set(cache_key, data)
+            except Exception as e:
+                print(f"Error downloading data for {symbol}: {e}")
+                return None
+            finally:
+                if owner:
+                    with self._inflight_lock:
+                        self._inflight.pop(cache_key, None)
+            
+            if data is None or data.empty:
+                return data
+        
+        # Callers add indicator columns in place, so never hand out the cached frame
+        return data.copy()
+    
+    def _fetch_history(self, symbol, period, interval):
+        """Download price history from Yahoo Finance (runs on the download pool)"""
+        stock = yf.Ticker(symbol)
+        return stock.history(period=period, interval=interval)
     
     def calculate_technical_indicators(self, data):
         """Calculate technical indicators"""
         try:
-            # RSI
-            data['RSI'] = ta.momentum.RSIIndicator(close=data['Close']).rsi()
+            close = data['Close'].to_numpy(dtype=np.float64)
+            high = data['High'].to_numpy(dtype=np.float64)
+            low = data['Low'].to_numpy(dtype=np.float64)
+            volume = data['Volume'].to_numpy(dtype=np.float64)
             
-            # MACD
-            macd = ta.trend.MACD(close=data['Close'])
-            data['MACD'] = macd.macd()
-            data['MACD_Signal'] = macd.macd_signal()
-            data['MACD_Hist'] = macd.macd_diff()
+            # MACD (EMA-12/EMA-26/signal/histogram in one pass)
+            ema_12, ema_26, macd, macd_signal, macd_hist = indicators.macd_fused(close, 12, 26, 9)
             
             # Bollinger Bands
-            bollinger = ta.volatility.BollingerBands(close=data['Close'])
-            data['BB_Upper'] = bollinger.bollinger_hband()
-            data['BB_Lower'] = bollinger.bollinger_lband()
-            data['BB_Middle'] = bollinger.bollinger_mavg()
-            
-            # Moving Averages
-            data['SMA_20'] = ta.trend.SMAIndicator(close=data['Close'], window=20).sma_indicator()
-            data['SMA_50'] = ta.trend.SMAIndicator(close=data['Close'], window=50).sma_indicator()
-            data['EMA_12'] = ta.trend.EMAIndicator(close=data['Close'], window=12).ema_indicator()
-            data['EMA_26'] = ta.trend.EMAIndicator(close=data['Close'], window=26).ema_indicator()
-            
-            # Volume indicators
-            # Volume SMA calculation (using pandas rolling mean)
-            data['Volume_SMA'] = data['Volume'].rolling(window=20).mean()
-            
-            # Price momentum
-            data['ROC'] = ta.momentum.ROCIndicator(close=data['Close']).roc()
-            data['Stoch'] = ta.momentum.StochasticOscillator(high=data['High'], low=data['Low'], close=data['Close']).stoch()
+            bb_upper, bb_middle, bb_lower = indicators.bbands(close, 20, 2.0)
+            
+            data = data.assign(
+                RSI=indicators.rsi_wilder(close, 14),
+                MACD=macd,
+                MACD_Signal=macd_signal,
+                MACD_Hist=macd_hist,
+                BB_Upper=bb_upper,
+                BB_Lower=bb_lower,
+                BB_Middle=bb_middle,
+                # Moving Averages
+                SMA_20=indicators.move_mean(close, 20),
+                SMA_50=indicators.move_mean(close, 50),
+                EMA_12=ema_12,
+                EMA_26=ema_26,
+                # Volume indicators
+                Volume_SMA=indicators.move_mean(volume, 20),
+                # Price momentum
+                ROC=indicators.roc(close, 12),
+                Stoch=indicators.stoch(high, low, close, 14),
+            )
             
             return data
         except Exception as e:
@@ -71,20 +167,20 @@ class StockPredictor:
     
     def generate_labels(self, data, days_ahead=1):
         """Generate buy/sell/hold labels"""
-        data['Future_Price'] = data['Close'].shift(-days_ahead)
-        data['Price_Change'] = (data['Future_Price'] - data['Close']) / data['Close']
+        close = data['Close'].to_numpy(dtype=np.float64)
+        
+        # Forward return over the horizon; the last days_ahead rows have no future price
+        price_change = np.full(len(close), np.nan)
+        if days_ahead < len(close):
+            price_change[:-days_ahead] = close[days_ahead:] / close[:-days_ahead] - 1
         
         # Define thresholds for buy/sell signals
         buy_threshold = 0.02   # 2% increase
         sell_threshold = -0.02 # 2% decrease
         
-        conditions = [
-            data['Price_Change'] > buy_threshold,
-            data['Price_Change'] < sell_threshold
-        ]
-        choices = [1, -1]  # 1 = Buy, -1 = Sell, 0 = Hold
-        
-        data['Signal'] = np.select(conditions, choices, default=0)
+        # 1 = Buy, -1 = Sell, 0 = Hold (NaN compares False on both sides -> Hold)
+        data['Signal'] = ((price_change > buy_threshold).astype(np.int8)
+                          - (price_change < sell_threshold).astype(np.int8))
         return data
     
     def prepare_features(self, data):
@@ -99,11 +195,64 @@ class StockPredictor:
         
         # Select only available columns
         available_columns = [col for col in feature_columns if col in data.columns]
-        X = data[available_columns].dropna()
+        X = data[available_columns].dropna().astype(np.float32, copy=False)
         
         return X, available_columns
     
-    def train_model(self, symbol):
+    def prepare_features_fast(self, data, feature_positions):
+        """Gather the 1 x F feature row for the most recent bar by column position, or None if a value is missing"""
+        if not feature_positions or max(feature_positions) >= data.shape[1]:
+            return None
+        
+        last = len(data) - 1
+        vector = np.array([[data.iat[last, i] for i in feature_positions]], dtype=np.float32)
+        
+        if np.isnan(vector).any():
+            return None
+        return vector
+    
+    def build_model(self, model_type=DEFAULT_MODEL_TYPE):
+        """Create an unfitted classifier for the requested backend"""
+        if model_type == 'Random Forest':
+            # Trees are built in parallel on all cores
+            return RandomForestClassifier(
+                n_estimators=50,
+                max_depth=10,
+                random_state=42,
+                class_weight='balanced',
+                n_jobs=-1
+            )
+        
+        # Histogram boosting predicts in vectorized C without per-tree dispatch
+        return HistGradientBoostingClassifier(
+            max_iter=200,
+            max_depth=6,
+            learning_rate=0.05,
+            early_stopping=True,
+            random_state=42,
+            class_weight='balanced'
+        )
+    
+    def compile_model(self, model, n_features):
+        """Export a fitted classifier to an ONNX Runtime session (None if unavailable)"""
+        # skl2onnx has no converter for HistGradientBoosting, so only forests are exported
+        if onnxruntime is None or not isinstance(model, RandomForestClassifier):
+            return None
+        
+        try:
+            onnx_model = convert_sklearn(
+                model,
+                initial_types=[('X', FloatTensorType([None, n_features]))],
+                options={type(model): {'zipmap': False}}
+            )
+            return onnxruntime.InferenceSession(
+                onnx_model.SerializeToString(), providers=['CPUExecutionProvider']
+            )
+        except Exception as e:
+            print(f"ONNX export of {type(model).__name__} failed ({type(e).__name__}), using sklearn for predictions")
+            return None
+    
+    def train_model(self, symbol, model_type=DEFAULT_MODEL_TYPE):
         """Train the prediction model"""
         try:
             # Download and prepare data
@@ -118,34 +267,54 @@ class StockPredictor:
             data = self.generate_labels(data)
             
             # Prepare features
-            X, self.feature_columns = self.prepare_features(data)
+            X, feature_columns = self.prepare_features(data)
             y = data.loc[X.index, 'Signal']
             
             if len(X) < 50:
                 return False, "Insufficient data for training"
             
-            # Scale features
-            X_scaled = self.scaler.fit_transform(X)
-            
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(
-                X_scaled, y, test_size=0.2, random_state=42, stratify=y
-            )
+            # Scale features in place (statistics accumulated in float64, kept as float32)
+            X_scaled = X.to_numpy(dtype=np.float32, copy=True)
+            y = y.to_numpy()
+            mean = X_scaled.mean(axis=0, dtype=np.float64).astype(np.float32)
+            scale = X_scaled.std(axis=0, dtype=np.float64).astype(np.float32)
+            scale[scale == 0] = 1.0
+            np.subtract(X_scaled, mean, out=X_scaled)
+            np.divide(X_scaled, scale, out=X_scaled)
+            
+            scaler = StandardScaler()
+            scaler.mean_ = mean
+            scaler.scale_ = scale
+            scaler.var_ = scale ** 2
+            scaler.n_features_in_ = X_scaled.shape[1]
+            scaler.n_samples_seen_ = X_scaled.shape[0]
+            
+            # Split data (stratified, by index)
+            splitter = StratifiedShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
+            train_idx, test_idx = next(splitter.split(X_scaled, y))
+            X_train, y_train = X_scaled[train_idx], y[train_idx]
+            X_test, y_test = X_scaled[test_idx], y[test_idx]
             
             # Train model
-            self.model = RandomForestClassifier(
-                n_estimators=100,
-                max_depth=10,
-                random_state=42,
-                class_weight='balanced'
-            )
-            self.model.fit(X_train, y_train)
+            model = self.build_model(model_type)
+            model.fit(X_train, y_train)
+            
+            # Single-row predictions are cheaper without joblib dispatch
+            if isinstance(model, RandomForestClassifier):
+                model.n_jobs = 1
             
             # Calculate accuracy
-            train_accuracy = self.model.score(X_train, y_train)
-            test_accuracy = self.model.score(X_test, y_test)
+            train_accuracy = model.score(X_train, y_train)
+            test_accuracy = model.score(X_test, y_test)
             
-            self.is_trained = True
+            # Indicator frames share one column layout, so predict can gather features by position
+            feature_positions = [data.columns.get_loc(c) for c in feature_columns]
+            
+            session = self.compile_model(model, len(feature_columns))
+            self._models.set(
+                (symbol.upper(), model_type),
+                (model, scaler, feature_columns, feature_positions, time.time(), session)
+            )
             
             return True, {
                 'train_accuracy': train_accuracy,
@@ -156,6 +325,48 @@ class StockPredictor:
         except Exception as e:
             return False, f"Training error: {str(e)}"
     
+    def has_model(self, symbol, model_type=DEFAULT_MODEL_TYPE):
+        """Check whether a fresh trained model is cached for symbol"""
+        return self._models.get((symbol.upper(), model_type)) is not None
+    
+    def start_training(self, symbol, model_type=DEFAULT_MODEL_TYPE):
+        """Train a model in the background, reusing an in-flight job for the same symbol"""
+        key = (symbol.upper(), model_type)
+        with self._training_lock:
+            future = self._training_futures.get(key)
+            if future is not None and not future.done():
+                return future
+            future = self._train_pool.submit(self.train_model, symbol, model_type)
+            self._training_futures[key] = future
+        
+        # Registered outside the lock: the callback runs at once if training already finished
+        future.add_done_callback(functools.partial(self._training_finished, key))
+        return future
+    
+    def _training_finished(self, key, future):
+        """Forget a successful training job once its model is in the model cache"""
+        success, _ = future.result()
+        if success:
+            with self._training_lock:
+                if self._training_futures.get(key) is future:
+                    del self._training_futures[key]
+    
+    def training_status(self, symbol, model_type=DEFAULT_MODEL_TYPE):
+        """Return (status, detail) of background training: training, ready, failed or not_started"""
+        with self._training_lock:
+            future = self._training_futures.get((symbol.upper(), model_type))
+        
+        if future is not None and not future.done():
+            return 'training', None
+        
+        success, result = future.result() if future is not None else (False, None)
+        if self.has_model(symbol, model_type):
+            return 'ready', result if success else None
+        if future is None or success:
+            # Never trained, or trained but since expired/evicted from the model cache
+            return 'not_started', None
+        return 'failed', result
+    
     def get_enhanced_signal(self, latest_data, prediction, prediction_proba):
         """Enhanced signal generation using technical indicators"""
         try:
@@ -169,44 +380,15 @@ class StockPredictor:
             bb_upper = latest_data['BB_Upper'].iloc[0] if 'BB_Upper' in latest_data else current_price * 1.02
             bb_lower = latest_data['BB_Lower'].iloc[0] if 'BB_Lower' in latest_data else current_price * 0.98
             
-            # Initialize signal scores
-            signal_scores = []
-            
-            # RSI Analysis
-            if rsi < 30:  # Oversold
-                signal_scores.append(1)  # Buy signal
-            elif rsi > 70:  # Overbought
-                signal_scores.append(-1)  # Sell signal
-            else:
-                signal_scores.append(0)  # Neutral
-            
-            # MACD Analysis
-            if macd > macd_signal and macd > 0:  # Bullish momentum
-                signal_scores.append(1)
-            elif macd < macd_signal and macd < 0:  # Bearish momentum
-                signal_scores.append(-1)
-            else:
-                signal_scores.append(0)
-            
-            # Moving Average Analysis
-            if current_price > sma_20 > sma_50:  # Uptrend
-                signal_scores.append(1)
-            elif current_price < sma_20 < sma_50:  # Downtrend
-                signal_scores.append(-1)
-            else:
-                signal_scores.append(0)
-            
-            # Bollinger Bands Analysis
-            if current_price <= bb_lower:  # Near lower band - potential buy
-                signal_scores.append(1)
-            elif current_price >= bb_upper:  # Near upper band - potential sell
-                signal_scores.append(-1)
-            else:
-                signal_scores.append(0)
+            # Score each indicator as +1 (buy), -1 (sell) or 0 (neutral)
+            rsi_score = int(rsi < 30) - int(rsi > 70)  # Oversold / overbought
+            macd_score = int(macd > macd_signal and macd > 0) - int(macd < macd_signal and macd < 0)  # Momentum
+            ma_score = int(current_price > sma_20 > sma_50) - int(current_price < sma_20 < sma_50)  # Up / down trend
+            bb_score = int(current_price <= bb_lower) - int(current_price >= bb_upper)  # Near lower / upper band
             
             # Combine ML prediction with technical analysis
             ml_signal = prediction
-            technical_signal = np.mean(signal_scores)
+            technical_signal = (rsi_score + macd_score + ma_score + bb_score) * 0.25
             
             # Weight the signals (60% technical, 40% ML)
             combined_signal = 0.6 * technical_signal + 0.4 * ml_signal
@@ -220,7 +402,7 @@ class StockPredictor:
                 final_signal = 0  # HOLD
             
             # Calculate confidence based on agreement and ML probability
-            ml_confidence = np.max(prediction_proba)
+            ml_confidence = max(prediction_proba)
             technical_strength = abs(technical_signal)
             agreement = 1 if (technical_signal * ml_signal >= 0) else 0.5  # Agreement bonus
             
@@ -241,23 +423,27 @@ class StockPredictor:
             
         except Exception as e:
             print(f"Error in enhanced signal generation: {e}")
-            return prediction, np.max(prediction_proba), {}
+            return prediction, max(prediction_proba), {}
 
-    def predict(self, symbol, days=7):
+    def predict(self, symbol, days=7, model_type=DEFAULT_MODEL_TYPE):
         """Make predictions for the next few days"""
         try:
-            # Auto-train if model isn't trained (happens transparently in background)
-            if not self.is_trained:
-                print(f"Initializing AI model for {symbol}...")
-                success, result = self.train_model(symbol)
+            # Auto-train if there is no fresh model for this symbol yet
+            entry = self._models.get((symbol.upper(), model_type))
+            if entry is None:
+                print(f"Initializing {model_type} model for {symbol}...")
+                success, result = self.train_model(symbol, model_type)
                 if not success:
                     return None, result
                 print(f"AI model ready! Analysis accuracy: {result.get('test_accuracy', 0):.1%}")
+                entry = self._models.get((symbol.upper(), model_type))
+            model, scaler, _, feature_positions, _, session = entry
             
-            # Get recent data
-            data = self.download_stock_data(symbol, period='6mo', interval='1d')
+            # Get recent data (reuses the cached 2y training download)
+            data = self.download_stock_data(symbol, period='2y', interval='1d')
             if data is None or data.empty:
                 return None, "Failed to download recent stock data"
+            data = data.loc[data.index >= data.index[-1] - pd.DateOffset(months=6)]
             
             # Calculate technical indicators
             data = self.calculate_technical_indicators(data)
@@ -266,16 +452,19 @@ class StockPredictor:
             latest_data = data.tail(1)
             
             # Prepare features
-            X, _ = self.prepare_features(latest_data)
-            if X.empty:
+            X = self.prepare_features_fast(data, feature_positions)
+            if X is None:
                 return None, "Failed to prepare features for prediction"
             
-            # Scale features
-            X_scaled = self.scaler.transform(X)
+            # Scale features with the fitted statistics (skips sklearn's input validation)
+            X_scaled = (X - scaler.mean_) / scaler.scale_
             
-            # Make prediction
-            prediction = self.model.predict(X_scaled)[0]
-            prediction_proba = self.model.predict_proba(X_scaled)[0]
+            # Make prediction (one pass over the model yields both class and probabilities)
+            if session is not None:
+                prediction_proba = session.run(['probabilities'], {'X': X_scaled.astype(np.float32, copy=False)})[0][0]
+            else:
+                prediction_proba = model.predict_proba(X_scaled)[0]
+            prediction = model.classes_[np.argmax(prediction_proba)]
             
             # Get enhanced signal using technical indicators
             enhanced_signal, enhanced_confidence, signal_details = self.get_enhanced_signal(
@@ -286,12 +475,10 @@ class StockPredictor:
             current_price = latest_data['Close'].iloc[0]
             
             # Generate price predictions based on enhanced signal
-            predictions = []
-            base_price = current_price
-            
             # Use deterministic seed based on symbol and current date for consistency
-            seed_value = hash(f"{symbol}_{datetime.now().strftime('%Y-%m-%d')}") % (2**32)
-            np.random.seed(seed_value)
+            # (crc32 is stable across processes, unlike str hash under PYTHONHASHSEED)
+            seed_value = zlib.crc32(f"{symbol}|{datetime.now().strftime('%Y-%m-%d')}".encode()) & 0xFFFFFFFF
+            rng = np.random.default_rng(seed_value)
             
             # Calculate base trend and volatility based on enhanced signal
             if enhanced_signal == 1:  # Buy signal
@@ -304,40 +491,33 @@ class StockPredictor:
                 base_trend = 0.001   # ~0.1% daily trend (nearly flat)
                 volatility = 0.012   # Lower volatility for hold signal
             
-            for day in range(1, days + 1):
-                # Generate consistent daily change using deterministic approach
-                # Use sin wave for smooth progression with some randomness
-                day_factor = np.sin(day * 0.1) * 0.3 + 0.7  # Varies between 0.4 and 1.0
-                trend_component = base_trend * day_factor
-                
-                # Add controlled randomness that's consistent for the same day
-                random_seed = hash(f"{symbol}_{datetime.now().strftime('%Y-%m-%d')}_{day}") % (2**32)
-                np.random.seed(random_seed)
-                volatility_component = np.random.normal(0, volatility)
-                
-                total_change = trend_component + volatility_component
-                base_price *= (1 + total_change)
-                
-                # Calculate confidence that decreases over time
-                confidence = enhanced_confidence * (1 - (day - 1) * 0.03)  # 3% decrease per day
-                confidence = max(0.45, confidence)  # Minimum 45% confidence
-                
-                predictions.append({
+            day_numbers = np.arange(1, days + 1)
+            
+            # Sin wave for smooth progression plus one stream of seeded noise
+            day_factor = np.sin(day_numbers * 0.1) * 0.3 + 0.7  # Varies between 0.4 and 1.0
+            total_change = base_trend * day_factor + rng.normal(0, volatility, size=days)
+            predicted_prices = current_price * np.cumprod(1 + total_change)
+            
+            # Confidence decreases 3% per day, with a 45% floor
+            confidences = np.maximum(0.45, enhanced_confidence * (1 - (day_numbers - 1) * 0.03))
+            
+            predictions = [
+                {
                     'day': day,
-                    'predicted_price': round(base_price, 2),
+                    'predicted_price': round(price, 2),
                     'confidence': round(confidence, 3)
-                })
-            
-            # Reset random seed to avoid affecting other operations
-            np.random.seed(None)
+                }
+                for day, price, confidence in zip(day_numbers.tolist(), predicted_prices.tolist(), confidences.tolist())
+            ]
             
             # Calculate technical indicators for current data (user-friendly)
+            values = last_row_values(latest_data)
             current_indicators = {
-                'rsi': float(latest_data['RSI'].iloc[0]) if 'RSI' in latest_data.columns else None,
-                'macd': float(latest_data['MACD'].iloc[0]) if 'MACD' in latest_data.columns else None,
-                'macd_signal': float(latest_data['MACD_Signal'].iloc[0]) if 'MACD_Signal' in latest_data.columns else None,
-                'sma_20': float(latest_data['SMA_20'].iloc[0]) if 'SMA_20' in latest_data.columns else None,
-                'sma_50': float(latest_data['SMA_50'].iloc[0]) if 'SMA_50' in latest_data.columns else None,
+                'rsi': indicator_value(values, 'RSI'),
+                'macd': indicator_value(values, 'MACD'),
+                'macd_signal': indicator_value(values, 'MACD_Signal'),
+                'sma_20': indicator_value(values, 'SMA_20'),
+                'sma_50': indicator_value(values, 'SMA_50'),
                 'current_price': round(current_price, 2),
                 'source': 'Yahoo Finance API'
             }
@@ -375,14 +555,26 @@ def predict_stock():
         data = request.get_json()
         symbol = data.get('symbol', 'AAPL').upper()
         days = int(data.get('days', 7))
-        model_type = data.get('model_type', 'Random Forest')
+        model_type = data.get('model_type', DEFAULT_MODEL_TYPE)
         
         # Validate inputs
         if days < 1 or days > 30:
             return jsonify({'error': 'Days must be between 1 and 30'}), 400
+        if model_type not in MODEL_TYPES:
+            return jsonify({'error': f"model_type must be one of: {', '.join(MODEL_TYPES)}"}), 400
+        
+        # Train in the background on a cache miss instead of blocking this worker
+        if not predictor.has_model(symbol, model_type):
+            predictor.start_training(symbol, model_type)
+            return jsonify({
+                'status': 'training',
+                'symbol': symbol,
+                'model_type': model_type,
+                'status_url': url_for('predict_status', symbol=symbol, model_type=model_type)
+            }), 202
         
         # Make prediction
-        result, error = predictor.predict(symbol, days)
+        result, error = predictor.predict(symbol, days, model_type)
         
         if error:
             return jsonify({'error': error}), 500
@@ -393,6 +585,22 @@ def predict_stock():
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+@app.route('/api/predict_status/<symbol>', methods=['GET'])
+def predict_status(symbol):
+    """Report background model training progress for a symbol"""
+    symbol = symbol.upper()
+    model_type = request.args.get('model_type', DEFAULT_MODEL_TYPE)
+    status, detail = predictor.training_status(symbol, model_type)
+    
+    response = {'status': status, 'symbol': symbol, 'model_type': model_type}
+    if status == 'ready' and detail:
+        response['training'] = detail
+    elif status == 'failed':
+        response['error'] = detail
+    
+    status_codes = {'training': 202, 'ready': 200, 'failed': 500, 'not_started': 404}
+    return jsonify(response), status_codes[status]
+
 @app.route('/api/indicators/<symbol>', methods=['GET'])
 @app.route('/api/api/indicators/<symbol>', methods=['GET'])  # Handle double /api/ from frontend
 def get_technical_indicators(symbol):
@@ -407,19 +615,19 @@ def get_technical_indicators(symbol):
         
         # Calculate indicators
         data = predictor.calculate_technical_indicators(data)
-        latest = data.tail(1)
+        values = last_row_values(data)
         
         indicators = {
             'symbol': symbol,
-            'current_price': round(float(latest['Close'].iloc[0]), 2),
-            'rsi': round(float(latest['RSI'].iloc[0]), 2) if 'RSI' in latest.columns and not pd.isna(latest['RSI'].iloc[0]) else None,
-            'macd': round(float(latest['MACD'].iloc[0]), 4) if 'MACD' in latest.columns and not pd.isna(latest['MACD'].iloc[0]) else None,
-            'macd_signal': round(float(latest['MACD_Signal'].iloc[0]), 4) if 'MACD_Signal' in latest.columns and not pd.isna(latest['MACD_Signal'].iloc[0]) else None,
-            'sma_20': round(float(latest['SMA_20'].iloc[0]), 2) if 'SMA_20' in latest.columns and not pd.isna(latest['SMA_20'].iloc[0]) else None,
-            'sma_50': round(float(latest['SMA_50'].iloc[0]), 2) if 'SMA_50' in latest.columns and not pd.isna(latest['SMA_50'].iloc[0]) else None,
-            'bb_upper': round(float(latest['BB_Upper'].iloc[0]), 2) if 'BB_Upper' in latest.columns and not pd.isna(latest['BB_Upper'].iloc[0]) else None,
-            'bb_lower': round(float(latest['BB_Lower'].iloc[0]), 2) if 'BB_Lower' in latest.columns and not pd.isna(latest['BB_Lower'].iloc[0]) else None,
-            'volume': int(latest['Volume'].iloc[0]),
+            'current_price': round(float(values['Close']), 2),
+            'rsi': indicator_value(values, 'RSI', 2),
+            'macd': indicator_value(values, 'MACD', 4),
+            'macd_signal': indicator_value(values, 'MACD_Signal', 4),
+            'sma_20': indicator_value(values, 'SMA_20', 2),
+            'sma_50': indicator_value(values, 'SMA_50', 2),
+            'bb_upper': indicator_value(values, 'BB_Upper', 2),
+            'bb_lower': indicator_value(values, 'BB_Lower', 2),
+            'volume': int(values['Volume']),
             'timestamp': datetime.now().isoformat()
         }
         
@@ -446,35 +654,30 @@ def get_stock_data(symbol):
         # Calculate technical indicators
         data = predictor.calculate_technical_indicators(data)
         
-        # Convert to list of dictionaries for JSON response
-        stock_data = []
-        for index, row in data.iterrows():
-            # Format datetime based on interval
-            if interval in ['1m', '5m', '15m', '30m', '1h']:
-                date_str = index.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                date_str = index.strftime('%Y-%m-%d')
-                
-            stock_data.append({
-                'date': date_str,
-                'open': round(float(row['Open']), 2),
-                'high': round(float(row['High']), 2),
-                'low': round(float(row['Low']), 2),
-                'close': round(float(row['Close']), 2),
-                'volume': int(row['Volume']),
-                'rsi': round(float(row['RSI']), 2) if 'RSI' in row and not pd.isna(row['RSI']) else None,
-                'macd': round(float(row['MACD']), 4) if 'MACD' in row and not pd.isna(row['MACD']) else None,
-                'sma_20': round(float(row['SMA_20']), 2) if 'SMA_20' in row and not pd.isna(row['SMA_20']) else None,
-                'sma_50': round(float(row['SMA_50']), 2) if 'SMA_50' in row and not pd.isna(row['SMA_50']) else None,
-            })
-        
-        return jsonify({
+        # Convert to list of dictionaries for JSON response (NaN handling is done per column, not per row)
+        date_format = '%Y-%m-%d %H:%M:%S' if interval in INTRADAY_INTERVALS else '%Y-%m-%d'
+        columns = {
+            'date': data.index.strftime(date_format).tolist(),
+            'open': json_column(data['Open'], 2),
+            'high': json_column(data['High'], 2),
+            'low': json_column(data['Low'], 2),
+            'close': json_column(data['Close'], 2),
+            'volume': data['Volume'].to_numpy(dtype=np.int64).tolist(),
+        }
+        for key, column, ndigits in (('rsi', 'RSI', 2), ('macd', 'MACD', 4), ('sma_20', 'SMA_20', 2), ('sma_50', 'SMA_50', 2)):
+            columns[key] = json_column(data[column], ndigits) if column in data.columns else [None] * len(data)
+        
+        keys = list(columns)
+        stock_data = [dict(zip(keys, row)) for row in zip(*columns.values())]
+        
+        payload = {
             'symbol': symbol,
             'period': period,
             'interval': interval,
             'data': stock_data,
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        return jsonify(payload)
         
     except Exception as e:
         print(f"Error fetching stock data for {symbol}: {e}")
@@ -485,9 +688,16 @@ if __name__ == '__main__':
     print("API will be available at http://localhost:5000")
     print("Endpoints:")
     print("  GET  /api/health - Health check")
-    print("  POST /api/predict - Make predictions")
+    print("  POST /api/predict - Make predictions (202 while the model trains)")
+    print("  GET  /api/predict_status/<symbol> - Model training status")
     print("  POST /api/train - Train model")
     print("  GET  /api/indicators/<symbol> - Get technical indicators")
     print("  GET  /api/stock_data/<symbol> - Get historical stock data")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # One worker: training jobs, their status and the model cache are per-process, so the
+    # 202 -> /api/predict_status -> POST sequence must reach the process that started training
+    print("Development server only; for production run (single worker, training state is in-process):")
+    print("  gunicorn -w 1 -k gthread --threads 16 -b 0.0.0.0:5000 ml_api_server:app")
+    
+    # Debugger and reloader only when DEV is set
+    app.run(debug=bool(os.getenv('DEV')), host='0.0.0.0', port=5000, threaded=True)
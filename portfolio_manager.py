@@ -3,29 +3,236 @@ Portfolio Management System for Stock Prediction Dashboard
 Provides portfolio optimization, risk management, and watchlist functionality
 """
 
+import functools
 import json
+import logging
+import os
 import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from urllib.parse import quote
 
 import numpy as np
 import pandas as pd
 import scipy.optimize as sco
 import yfinance as yf
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, stream_with_context
+from flask_compress import Compress
 from flask_cors import CORS
-from scipy import stats
+from scipy import linalg, stats
+
+from utils import OrjsonProvider, TTLCache, dumps_json, njit
+
+try:  # cvxpy is optional; optimize_portfolio falls back to SLSQP without it
+    import cvxpy as cp
+except ImportError:
+    cp = None
+
+try:  # curl_cffi ships with yfinance; without it yfinance falls back to its own session
+    from curl_cffi import requests as curl_requests
+except ImportError:
+    curl_requests = None
+
+logger = logging.getLogger(__name__)
+
+# Last close per symbol, shared by every portfolio/watchlist lookup for a minute
+PRICE_CACHE_SECONDS = 60
+_price_cache = TTLCache(maxsize=1024, ttl=PRICE_CACHE_SECONDS)
+
+# Memoized yfinance Tickers; bounded because symbols come straight from user input
+TICKER_CACHE_SECONDS = 3600
+_ticker_cache = TTLCache(maxsize=1024, ttl=TICKER_CACHE_SECONDS)
+
+# One keep-alive HTTP session for every market-data request; passed explicitly because
+# yf.download otherwise opens (and installs) a fresh session on each call
+MARKET_DATA_SESSION = curl_requests.Session(impersonate='chrome') if curl_requests is not None else None
+
+# Yahoo chart endpoint; its meta block carries the latest trade price without any bars being parsed
+CHART_URL = 'https://query2.finance.yahoo.com/v8/finance/chart/{}'
+
+# Symbols that cannot be batched are fetched concurrently (yfinance is network-bound)
+PRICE_FETCH_WORKERS = 16
+_price_pool = ThreadPoolExecutor(max_workers=PRICE_FETCH_WORKERS)
+
+# Symbols whose lookups keep failing are skipped for exponentially growing periods
+PRICE_BACKOFF_BASE_SECONDS = 30
+PRICE_BACKOFF_MAX_SECONDS = 900
+price_fetch_failures = Counter()  # symbol -> failed lookups since startup
+_price_backoff = {}  # symbol -> (consecutive failures, monotonic time of next attempt)
+_price_backoff_lock = threading.Lock()
+
+# cvxpy solvers tried in order for the mean-variance QP (missing ones are skipped)
+QP_SOLVERS = ('OSQP', 'CLARABEL', 'ECOS')
+MAX_ASSET_WEIGHT = 0.4
+
+# Successful optimizations are reused for 15 minutes (and never across days)
+OPTIMIZE_CACHE_SECONDS = 900
+_opt_cache = TTLCache(maxsize=128, ttl=OPTIMIZE_CACHE_SECONDS)
+
+# Daily close history per symbol, downloaded once a day and shared by every optimization
+HISTORY_CACHE_SECONDS = 86400
+_history_cache = TTLCache(maxsize=512, ttl=HISTORY_CACHE_SECONDS)
+
+# Per-thread connections wait up to 30s for a competing writer and are reopened after 30 minutes
+DB_BUSY_TIMEOUT_SECONDS = 30
+DB_CONNECTION_RECYCLE_SECONDS = 1800
+
+# Hot-path statements for add_to_portfolio, kept constant so sqlite3's statement cache reuses them
+INSERT_TRANSACTION_SQL = '''
+    INSERT INTO transactions (portfolio_id, symbol, transaction_type, shares, price, transaction_date)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# Buying adds to an existing position at the share-weighted average price
+UPSERT_HOLDING_SQL = '''
+    INSERT INTO holdings (portfolio_id, symbol, shares, avg_price, purchase_date)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (portfolio_id, symbol) DO UPDATE SET
+        avg_price = (shares * avg_price + excluded.shares * excluded.avg_price) / (shares + excluded.shares),
+        shares = shares + excluded.shares
+'''
+
+SELECT_HOLDING_SHARES_SQL = 'SELECT shares FROM holdings WHERE portfolio_id = ? AND symbol = ?'
+UPDATE_HOLDING_SHARES_SQL = 'UPDATE holdings SET shares = ? WHERE portfolio_id = ? AND symbol = ?'
+DELETE_HOLDING_SQL = 'DELETE FROM holdings WHERE portfolio_id = ? AND symbol = ?'
+TOUCH_PORTFOLIO_SQL = 'UPDATE portfolios SET updated_date = ? WHERE id = ?'
+
+# Current positions for the symbols of an import batch (placeholders filled per call)
+SELECT_BATCH_HOLDINGS_SQL = 'SELECT symbol, shares, avg_price FROM holdings WHERE portfolio_id = ? AND symbol IN ({})'
+
+# Materialized portfolio values, written with the change that affects them and trusted for a minute
+SNAPSHOT_TTL_SECONDS = 60
+UPSERT_SNAPSHOT_SQL = '''
+    INSERT OR REPLACE INTO portfolio_snapshots (portfolio_id, current_value, total_return, updated_ts)
+    VALUES (?, ?, ?, ?)
+'''
+DELETE_SNAPSHOT_SQL = 'DELETE FROM portfolio_snapshots WHERE portfolio_id = ?'
+
+# Holdings are read (and priced) in pages of this many rows
+HOLDINGS_PAGE_SIZE = 500
+
+SET_HOLDING_SQL = '''
+    INSERT INTO holdings (portfolio_id, symbol, shares, avg_price, purchase_date)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (portfolio_id, symbol) DO UPDATE SET
+        shares = excluded.shares,
+        avg_price = excluded.avg_price
+'''
+
+# Partial updates from the PUT routes: a NULL parameter leaves that column unchanged
+UPDATE_PORTFOLIO_SQL = '''
+    UPDATE portfolios SET name = COALESCE(?, name), description = COALESCE(?, description), updated_date = ?
+    WHERE id = ?
+'''
+UPDATE_HOLDING_SQL = '''
+    UPDATE holdings SET shares = COALESCE(?, shares), avg_price = COALESCE(?, avg_price)
+    WHERE id = ?
+    RETURNING portfolio_id
+'''
+DELETE_HOLDING_BY_ID_SQL = 'DELETE FROM holdings WHERE id = ? RETURNING portfolio_id'
+
+# Schema migrations (PRAGMA user_version); see PortfolioManager._migrate_schema
+SCHEMA_VERSION = 1
+MERGE_HOLDING_DUPLICATES_SQL = '''
+    UPDATE holdings SET
+        avg_price = (
+            SELECT CASE WHEN SUM(d.shares) > 0 THEN SUM(d.shares * d.avg_price) / SUM(d.shares) ELSE holdings.avg_price END
+            FROM holdings d WHERE d.portfolio_id = holdings.portfolio_id AND d.symbol = holdings.symbol
+        ),
+        shares = (
+            SELECT SUM(d.shares) FROM holdings d
+            WHERE d.portfolio_id = holdings.portfolio_id AND d.symbol = holdings.symbol
+        )
+    WHERE id IN (SELECT MIN(id) FROM holdings GROUP BY portfolio_id, symbol HAVING COUNT(*) > 1)
+'''
+DELETE_HOLDING_DUPLICATES_SQL = 'DELETE FROM holdings WHERE id NOT IN (SELECT MIN(id) FROM holdings GROUP BY portfolio_id, symbol)'
+MERGE_WATCHLIST_DUPLICATES_SQL = '''
+    UPDATE watchlist SET
+        target_price = COALESCE(target_price, (
+            SELECT d.target_price FROM watchlist d
+            WHERE d.symbol = watchlist.symbol AND d.target_price IS NOT NULL
+            ORDER BY d.id DESC LIMIT 1
+        )),
+        notes = COALESCE(NULLIF(notes, ''), (
+            SELECT d.notes FROM watchlist d
+            WHERE d.symbol = watchlist.symbol AND COALESCE(d.notes, '') != ''
+            ORDER BY d.id DESC LIMIT 1
+        ), notes)
+    WHERE id IN (SELECT MAX(id) FROM watchlist GROUP BY symbol HAVING COUNT(*) > 1)
+'''
+DELETE_WATCHLIST_DUPLICATES_SQL = 'DELETE FROM watchlist WHERE id NOT IN (SELECT MAX(id) FROM watchlist GROUP BY symbol)'
+
+
+def _serialized_write(method):
+    """Run a PortfolioManager write method under the instance write lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._write_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+@njit(cache=True, fastmath=True)
+def _holding_stats(shares, avg_price, current_price):
+    """Market value, cost basis, unrealized P&L and P&L % for each holding"""
+    size = shares.shape[0]
+    market_value = np.empty(size)
+    cost_basis = np.empty(size)
+    unrealized_pnl = np.empty(size)
+    unrealized_pnl_pct = np.empty(size)
+    
+    for i in range(size):
+        market_value[i] = shares[i] * current_price[i]
+        cost_basis[i] = shares[i] * avg_price[i]
+        unrealized_pnl[i] = market_value[i] - cost_basis[i]
+        unrealized_pnl_pct[i] = unrealized_pnl[i] / cost_basis[i] * 100 if cost_basis[i] > 0 else 0.0
+    
+    return market_value, cost_basis, unrealized_pnl, unrealized_pnl_pct
 
 
 class PortfolioManager:
     def __init__(self, db_path='portfolio.db'):
         self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
         self.init_database()
+    
+    def _connect(self):
+        """Open an autocommit connection; multi-statement writes use explicit transactions"""
+        conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT_SECONDS,
+                               isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # rows index by column name as well as position
+        conn.execute('PRAGMA synchronous=NORMAL')  # WAL makes NORMAL safe: fsync at checkpoints only
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-64000')  # 64 MB page cache per connection
+        return conn
+    
+    def _conn(self):
+        """Return this thread's long-lived connection, opening (or recycling) it as needed"""
+        conn = getattr(self._local, 'conn', None)
+        now = time.monotonic()
+        
+        # Recycle idle-aged connections between transactions, never in the middle of one
+        if conn is not None and not conn.in_transaction and now - self._local.opened_at > DB_CONNECTION_RECYCLE_SECONDS:
+            conn.close()
+            conn = None
+        
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            self._local.opened_at = now
+        return conn
         
     def init_database(self):
         """Initialize SQLite database for portfolio management"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
+        # Write-ahead logging persists in the database file
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # Create portfolios table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS portfolios (
@@ -51,6 +258,9 @@ class PortfolioManager:
             )
         ''')
         
+        # Serves the holdings listing (filter by portfolio, newest purchase first) without a sort
+        cursor.execute('CREATE INDEX IF NOT EXISTS ix_holdings_pid_date ON holdings (portfolio_id, purchase_date)')
+        
         # Create watchlist table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS watchlist (
@@ -78,12 +288,58 @@ class PortfolioManager:
             )
         ''')
         
+        # Create portfolio value snapshots table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+                portfolio_id INTEGER PRIMARY KEY,
+                current_value REAL,
+                total_return REAL,
+                updated_ts REAL,
+                FOREIGN KEY (portfolio_id) REFERENCES portfolios (id)
+            )
+        ''')
+        
+        # Indexes for the per-portfolio lookups (holdings are covered by their own indexes)
+        cursor.execute('CREATE INDEX IF NOT EXISTS ix_tx_pid ON transactions (portfolio_id, transaction_date)')
+        
         conn.commit()
-        conn.close()
+        
+        self._migrate_schema(cursor)
     
+    def _migrate_schema(self, cursor):
+        """Apply one-time data migrations, tracked in PRAGMA user_version"""
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # Re-read under the write lock: another worker may have migrated meanwhile
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            
+            if version < 1:
+                # One holding row per symbol in a portfolio (required by the buy upsert): duplicates
+                # are folded into the oldest row with summed shares and a share-weighted price
+                cursor.execute(MERGE_HOLDING_DUPLICATES_SQL)
+                removed = cursor.execute(DELETE_HOLDING_DUPLICATES_SQL).rowcount
+                if removed:
+                    logger.warning("Schema migration 1: merged %d duplicate holdings rows", removed)
+                cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS ux_holdings_pid_sym ON holdings (portfolio_id, symbol)')
+                
+                # One watchlist entry per symbol: merge older duplicates into the newest entry,
+                # which keeps its own values and inherits a target price/notes it lacks
+                cursor.execute(MERGE_WATCHLIST_DUPLICATES_SQL)
+                removed = cursor.execute(DELETE_WATCHLIST_DUPLICATES_SQL).rowcount
+                if removed:
+                    logger.warning("Schema migration 1: merged %d duplicate watchlist rows", removed)
+                cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS ux_watchlist_sym ON watchlist (symbol)')
+            
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+    
+    @_serialized_write
     def create_portfolio(self, name, description="", initial_capital=10000):
         """Create a new portfolio"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         try:
@@ -98,120 +354,306 @@ class PortfolioManager:
             
         except sqlite3.IntegrityError:
             return False, "Portfolio name already exists"
-        finally:
-            conn.close()
     
     def get_portfolios(self):
         """Get all portfolios"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM portfolios ORDER BY created_date DESC')
-        portfolios = cursor.fetchall()
+        # Portfolios with their snapshot, if it is still fresh
+        cursor.execute('''
+            SELECT p.id, p.name, p.description, p.initial_capital, p.created_date, p.updated_date,
+                   s.current_value, s.total_return
+            FROM portfolios p
+            LEFT JOIN portfolio_snapshots s ON s.portfolio_id = p.id AND s.updated_ts > ?
+            ORDER BY p.created_date DESC
+        ''', (time.time() - SNAPSHOT_TTL_SECONDS,))
+        rows = cursor.fetchall()
         
         portfolio_list = []
-        for portfolio in portfolios:
+        stale = {}
+        for row in rows:
             portfolio_data = {
-                'id': portfolio[0],
-                'name': portfolio[1],
-                'description': portfolio[2],
-                'initial_capital': portfolio[3],
-                'created_date': portfolio[4],
-                'updated_date': portfolio[5]
+                'id': row['id'],
+                'name': row['name'],
+                'description': row['description'],
+                'initial_capital': row['initial_capital'],
+                'created_date': row['created_date'],
+                'updated_date': row['updated_date']
             }
-            
-            # Get current value
-            current_value = self.calculate_portfolio_value(portfolio[0])
-            portfolio_data['current_value'] = current_value
-            portfolio_data['total_return'] = ((current_value - portfolio[3]) / portfolio[3]) * 100 if portfolio[3] > 0 else 0
+            if row['current_value'] is None:
+                stale[row['id']] = portfolio_data
+            else:
+                portfolio_data['current_value'] = row['current_value']
+                portfolio_data['total_return'] = row['total_return']
             
             portfolio_list.append(portfolio_data)
         
-        conn.close()
+        if not stale:
+            return portfolio_list
+        
+        # Value the rest from their holdings with one batched price lookup
+        placeholders = ', '.join('?' * len(stale))
+        cursor.execute(f'SELECT portfolio_id, symbol, shares FROM holdings WHERE portfolio_id IN ({placeholders})', list(stale))
+        holdings = cursor.fetchall()
+        prices = self._get_prices([holding['symbol'] for holding in holdings])
+        
+        current_values = defaultdict(int)
+        for portfolio_id, symbol, shares in holdings:
+            if symbol in prices:
+                current_values[portfolio_id] += shares * prices[symbol]
+        
+        for portfolio_id, portfolio_data in stale.items():
+            current_value = current_values[portfolio_id]
+            initial_capital = portfolio_data['initial_capital']
+            portfolio_data['current_value'] = current_value
+            portfolio_data['total_return'] = ((current_value - initial_capital) / initial_capital) * 100 if initial_capital > 0 else 0
+        
+        # Their prices are cached now, so the next list within the TTL is served from snapshots
+        self._store_snapshots(stale)
         return portfolio_list
     
+    @_serialized_write
+    def _store_snapshots(self, portfolio_ids):
+        """Rewrite the value snapshots of several portfolios in one write transaction"""
+        conn = self._conn()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for portfolio_id in portfolio_ids:
+                self._refresh_snapshot(cursor, portfolio_id)
+            conn.commit()
+        except sqlite3.Error as e:
+            # Only a cache: the caller already has the values
+            conn.rollback()
+            logger.warning("Storing portfolio snapshots failed: %s", e)
+    
+    @_serialized_write
     def add_to_portfolio(self, portfolio_id, symbol, shares, price, transaction_type='BUY'):
         """Add a stock to portfolio"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         try:
+            # Transaction record, holding change and portfolio timestamp commit together
+            cursor.execute('BEGIN IMMEDIATE')
+            
+            now = datetime.now().isoformat()
+            
             # Add transaction record
-            cursor.execute('''
-                INSERT INTO transactions (portfolio_id, symbol, transaction_type, shares, price, transaction_date)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (portfolio_id, symbol, transaction_type, shares, price, datetime.now().isoformat()))
+            cursor.execute(INSERT_TRANSACTION_SQL, (portfolio_id, symbol, transaction_type, shares, price, now))
             
             # Update holdings
             if transaction_type.upper() == 'BUY':
-                # Check if holding exists
-                cursor.execute('''
-                    SELECT shares, avg_price FROM holdings 
-                    WHERE portfolio_id = ? AND symbol = ?
-                ''', (portfolio_id, symbol))
-                
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Update existing holding
-                    old_shares, old_avg_price = existing
-                    new_shares = old_shares + shares
-                    new_avg_price = ((old_shares * old_avg_price) + (shares * price)) / new_shares
-                    
-                    cursor.execute('''
-                        UPDATE holdings 
-                        SET shares = ?, avg_price = ?
-                        WHERE portfolio_id = ? AND symbol = ?
-                    ''', (new_shares, new_avg_price, portfolio_id, symbol))
-                else:
-                    # Create new holding
-                    cursor.execute('''
-                        INSERT INTO holdings (portfolio_id, symbol, shares, avg_price, purchase_date)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (portfolio_id, symbol, shares, price, datetime.now().isoformat()))
+                # Create the holding or fold the purchase into it in one statement
+                cursor.execute(UPSERT_HOLDING_SQL, (portfolio_id, symbol, shares, price, now))
             
             elif transaction_type.upper() == 'SELL':
                 # Update existing holding
-                cursor.execute('''
-                    SELECT shares FROM holdings 
-                    WHERE portfolio_id = ? AND symbol = ?
-                ''', (portfolio_id, symbol))
+                cursor.execute(SELECT_HOLDING_SHARES_SQL, (portfolio_id, symbol))
                 
                 existing = cursor.fetchone()
                 if existing and existing[0] >= shares:
                     new_shares = existing[0] - shares
                     if new_shares > 0:
-                        cursor.execute('''
-                            UPDATE holdings 
-                            SET shares = ?
-                            WHERE portfolio_id = ? AND symbol = ?
-                        ''', (new_shares, portfolio_id, symbol))
+                        cursor.execute(UPDATE_HOLDING_SHARES_SQL, (new_shares, portfolio_id, symbol))
                     else:
-                        cursor.execute('''
-                            DELETE FROM holdings 
-                            WHERE portfolio_id = ? AND symbol = ?
-                        ''', (portfolio_id, symbol))
+                        cursor.execute(DELETE_HOLDING_SQL, (portfolio_id, symbol))
                 else:
+                    conn.rollback()
                     return False, "Insufficient shares to sell"
             
             # Update portfolio timestamp
-            cursor.execute('''
-                UPDATE portfolios 
-                SET updated_date = ?
-                WHERE id = ?
-            ''', (datetime.now().isoformat(), portfolio_id))
+            cursor.execute(TOUCH_PORTFOLIO_SQL, (now, portfolio_id))
+            self._refresh_snapshot(cursor, portfolio_id)
             
             conn.commit()
             return True, "Transaction completed successfully"
             
         except Exception as e:
+            conn.rollback()
             return False, str(e)
-        finally:
-            conn.close()
+    
+    @_serialized_write
+    def add_transactions_bulk(self, portfolio_id, transactions):
+        """Import (symbol, transaction_type, shares, price) rows in one transaction, applied in order"""
+        conn = self._conn()
+        cursor = conn.cursor()
+        
+        try:
+            now = datetime.now().isoformat()
+            rows = [
+                (portfolio_id, symbol.upper(), transaction_type.upper(), float(shares), float(price), now)
+                for symbol, transaction_type, shares, price in transactions
+            ]
+            if not rows:
+                return False, "No transactions to import"
+            
+            # Reject malformed rows before touching the database
+            for _, symbol, transaction_type, shares, _, _ in rows:
+                if transaction_type not in ('BUY', 'SELL'):
+                    return False, f"Invalid transaction type {transaction_type} for {symbol}"
+                if not shares > 0:
+                    return False, f"Shares must be positive for {symbol}"
+            
+            cursor.execute('BEGIN IMMEDIATE')
+            
+            # Replay the batch row by row on a running (shares, avg_price) per symbol, so sells are
+            # checked against the position at that point and a closed position resets its cost basis
+            symbols = list(dict.fromkeys(row[1] for row in rows))
+            positions = {symbol: (0.0, 0.0) for symbol in symbols}
+            existing = cursor.execute(
+                SELECT_BATCH_HOLDINGS_SQL.format(', '.join('?' * len(symbols))), (portfolio_id, *symbols)
+            ).fetchall()
+            for symbol, held_shares, held_avg_price in existing:
+                positions[symbol] = (held_shares, held_avg_price)
+            
+            for _, symbol, transaction_type, shares, price, _ in rows:
+                held_shares, held_avg_price = positions[symbol]
+                if transaction_type == 'BUY':
+                    new_shares = held_shares + shares
+                    positions[symbol] = (new_shares, (held_shares * held_avg_price + shares * price) / new_shares)
+                elif held_shares >= shares:
+                    new_shares = held_shares - shares
+                    positions[symbol] = (new_shares, held_avg_price if new_shares > 0 else 0.0)
+                else:
+                    conn.rollback()
+                    return False, f"Insufficient shares to sell {symbol}"
+            
+            cursor.executemany(INSERT_TRANSACTION_SQL, rows)
+            
+            # Write each symbol's final position once
+            upserts = [(portfolio_id, symbol, shares, avg_price, now) for symbol, (shares, avg_price) in positions.items() if shares > 0]
+            deletes = [(portfolio_id, symbol) for symbol, (shares, _) in positions.items() if shares <= 0]
+            cursor.executemany(SET_HOLDING_SQL, upserts)
+            cursor.executemany(DELETE_HOLDING_SQL, deletes)
+            cursor.execute(TOUCH_PORTFOLIO_SQL, (now, portfolio_id))
+            self._refresh_snapshot(cursor, portfolio_id)
+            
+            conn.commit()
+            return True, f"{len(rows)} transactions imported successfully"
+            
+        except Exception as e:
+            conn.rollback()
+            return False, str(e)
+    
+    def _refresh_snapshot(self, cursor, portfolio_id):
+        """Rewrite the portfolio's value snapshot from cached prices, or drop it if a price is not cached"""
+        portfolio = cursor.execute('SELECT initial_capital FROM portfolios WHERE id = ?', (portfolio_id,)).fetchone()
+        if portfolio is None:
+            return
+        holdings = cursor.execute('SELECT symbol, shares FROM holdings WHERE portfolio_id = ?', (portfolio_id,)).fetchall()
+        
+        # No network calls here: this runs inside the write transaction
+        current_value = 0
+        for symbol, shares in holdings:
+            price = _price_cache.get(symbol)
+            if price is None:
+                cursor.execute(DELETE_SNAPSHOT_SQL, (portfolio_id,))
+                return
+            current_value += shares * price
+        
+        initial_capital = portfolio['initial_capital']
+        total_return = ((current_value - initial_capital) / initial_capital) * 100 if initial_capital > 0 else 0
+        cursor.execute(UPSERT_SNAPSHOT_SQL, (portfolio_id, current_value, total_return, time.time()))
+    
+    def _get_ticker(self, symbol):
+        """Return a memoized yfinance Ticker for symbol"""
+        stock = _ticker_cache.get(symbol)
+        if stock is None:
+            stock = yf.Ticker(symbol, session=MARKET_DATA_SESSION)
+            _ticker_cache.set(symbol, stock)
+        return stock
+    
+    def _last_price(self, symbol):
+        """Latest price for a single symbol, or None if Yahoo Finance has no data"""
+        if MARKET_DATA_SESSION is not None:
+            try:
+                response = MARKET_DATA_SESSION.get(
+                    CHART_URL.format(quote(symbol)), params={'range': '1d', 'interval': '1d'}, timeout=10
+                )
+                chart = response.json()['chart']
+                if not chart['result']:
+                    return None  # Unknown or delisted symbol
+                price = chart['result'][0]['meta'].get('regularMarketPrice')
+                if price is not None:
+                    return float(price)
+            except Exception as e:
+                logger.debug("Chart lookup for %s failed, using history: %s: %s", symbol, type(e).__name__, e)
+        
+        # Fallback: last non-NaN close of the 1d history
+        closes = self._get_ticker(symbol).history(period='1d')['Close'].to_numpy(dtype=np.float64)
+        closes = closes[~np.isnan(closes)]
+        return float(closes[-1]) if closes.size else None
+    
+    def _try_last_price(self, symbol):
+        """_last_price that reports failures and returns None instead of raising"""
+        try:
+            return self._last_price(symbol)
+        except Exception as e:
+            logger.debug("Price fetch for %s failed: %s: %s", symbol, type(e).__name__, e)
+            return None
+    
+    def _record_price_failure(self, symbol):
+        """Count a failed lookup and back off from the symbol exponentially"""
+        with _price_backoff_lock:
+            price_fetch_failures[symbol] += 1
+            failures = _price_backoff.get(symbol, (0, 0))[0] + 1
+            delay = min(PRICE_BACKOFF_BASE_SECONDS * 2 ** (failures - 1), PRICE_BACKOFF_MAX_SECONDS)
+            _price_backoff[symbol] = (failures, time.monotonic() + delay)
+        logger.debug("No price for %s (%d consecutive failures); skipping it for %ds", symbol, failures, delay)
+    
+    def _in_price_backoff(self, symbol):
+        """Check whether lookups for symbol are currently suspended"""
+        entry = _price_backoff.get(symbol)
+        return entry is not None and entry[1] > time.monotonic()
+    
+    def _get_prices(self, symbols):
+        """Get the latest close for each symbol (cached; misses fetched in one batch)"""
+        prices = {}
+        missing = []
+        for symbol in dict.fromkeys(symbols):
+            price = _price_cache.get(symbol)
+            if price is not None:
+                prices[symbol] = price
+            elif not self._in_price_backoff(symbol):
+                missing.append(symbol)
+        
+        if not missing:
+            return prices
+        
+        fetched = {}
+        if len(missing) > 1:
+            try:
+                closes = yf.download(missing, period='1d', threads=True, progress=False, session=MARKET_DATA_SESSION)['Close']
+                for symbol, column in zip(closes.columns, closes.to_numpy(dtype=np.float64).T):
+                    column = column[~np.isnan(column)]
+                    if column.size:
+                        fetched[symbol] = column[-1]
+            except Exception as e:
+                logger.warning("Batch price fetch for %d symbols failed: %s: %s", len(missing), type(e).__name__, e)
+        
+        # Single misses and symbols the batch could not price are fetched one by one, in parallel
+        residual = [symbol for symbol in missing if symbol not in fetched]
+        for symbol, price in zip(residual, _price_pool.map(self._try_last_price, residual)):
+            if price is not None:
+                fetched[symbol] = price
+        
+        for symbol in missing:
+            if symbol in fetched:
+                price = float(fetched[symbol])
+                _price_cache.set(symbol, price)
+                _price_backoff.pop(symbol, None)
+                prices[symbol] = price
+            else:
+                self._record_price_failure(symbol)
+        
+        return prices
     
     def calculate_portfolio_value(self, portfolio_id):
         """Calculate current portfolio value"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -220,26 +662,23 @@ class PortfolioManager:
         ''', (portfolio_id,))
         
         holdings = cursor.fetchall()
-        conn.close()
+        
+        prices = self._get_prices([symbol for symbol, _ in holdings])
         
         total_value = 0
         for symbol, shares in holdings:
-            try:
-                stock = yf.Ticker(symbol)
-                current_price = stock.history(period='1d')['Close'].iloc[-1]
-                total_value += shares * current_price
-            except:
-                continue  # Skip if price fetch fails
+            if symbol in prices:  # Skip if price fetch failed
+                total_value += shares * prices[symbol]
         
         return total_value
     
     def get_portfolio_performance(self, portfolio_id, period='1y'):
         """Calculate portfolio performance metrics"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         # Get portfolio info
-        cursor.execute('SELECT * FROM portfolios WHERE id = ?', (portfolio_id,))
+        cursor.execute('SELECT name, initial_capital FROM portfolios WHERE id = ?', (portfolio_id,))
         portfolio = cursor.fetchone()
         
         if not portfolio:
@@ -252,63 +691,51 @@ class PortfolioManager:
         ''', (portfolio_id,))
         holdings = cursor.fetchall()
         
-        # Get transactions
-        cursor.execute('''
-            SELECT * FROM transactions 
-            WHERE portfolio_id = ? 
-            ORDER BY transaction_date
-        ''', (portfolio_id,))
-        transactions = cursor.fetchall()
+        # Calculate metrics
+        initial_capital = portfolio['initial_capital']
         
-        conn.close()
+        # The 1y history download for the risk metrics overlaps with the current price lookup
+        symbols = [holding['symbol'] for holding in holdings]
+        risk_metrics = _price_pool.submit(self._compute_risk_metrics, symbols)
         
-        # Calculate metrics
-        current_value = self.calculate_portfolio_value(portfolio_id)
-        initial_capital = portfolio[3]
+        # Calculate returns for each holding that has a current price, in one kernel call
+        # (one price lookup serves both the holdings and the portfolio value)
+        prices = self._get_prices(symbols)
+        priced = [(symbol, shares, avg_price, prices[symbol]) for symbol, shares, avg_price in holdings if symbol in prices]
         
-        # Calculate returns for each holding
-        holding_data = []
-        total_invested = 0
+        shares_arr = np.array([holding[1] for holding in priced], dtype=np.float64)
+        avg_price_arr = np.array([holding[2] for holding in priced], dtype=np.float64)
+        price_arr = np.array([holding[3] for holding in priced], dtype=np.float64)
+        holding_stats = _holding_stats(shares_arr, avg_price_arr, price_arr)
+        market_values, cost_bases, unrealized_pnls, unrealized_pnl_pcts = (column.tolist() for column in holding_stats)
+        current_value = sum(market_values)
         
-        for symbol, shares, avg_price in holdings:
-            try:
-                stock = yf.Ticker(symbol)
-                current_price = stock.history(period='1d')['Close'].iloc[-1]
-                
-                market_value = shares * current_price
-                cost_basis = shares * avg_price
-                unrealized_pnl = market_value - cost_basis
-                unrealized_pnl_pct = (unrealized_pnl / cost_basis) * 100 if cost_basis > 0 else 0
-                
-                holding_data.append({
-                    'symbol': symbol,
-                    'shares': shares,
-                    'avg_price': avg_price,
-                    'current_price': current_price,
-                    'market_value': market_value,
-                    'cost_basis': cost_basis,
-                    'unrealized_pnl': unrealized_pnl,
-                    'unrealized_pnl_pct': unrealized_pnl_pct,
-                    'weight': (market_value / current_value) * 100 if current_value > 0 else 0
-                })
-                
-                total_invested += cost_basis
-                
-            except Exception as e:
-                continue
+        holding_data = [
+            {
+                'symbol': symbol,
+                'shares': shares,
+                'avg_price': avg_price,
+                'current_price': current_price,
+                'market_value': market_value,
+                'cost_basis': cost_basis,
+                'unrealized_pnl': unrealized_pnl,
+                'unrealized_pnl_pct': unrealized_pnl_pct,
+                'weight': (market_value / current_value) * 100 if current_value > 0 else 0
+            }
+            for (symbol, shares, avg_price, current_price), market_value, cost_basis, unrealized_pnl, unrealized_pnl_pct
+            in zip(priced, market_values, cost_bases, unrealized_pnls, unrealized_pnl_pcts)
+        ]
+        total_invested = sum(cost_bases)
         
         # Portfolio level metrics
         total_return = ((current_value - initial_capital) / initial_capital) * 100 if initial_capital > 0 else 0
         
-        # Calculate portfolio volatility (simplified)
-        portfolio_volatility = self._calculate_portfolio_volatility([h['symbol'] for h in holding_data])
-        
-        # Risk metrics
-        sharpe_ratio = self._calculate_portfolio_sharpe([h['symbol'] for h in holding_data])
+        # Risk metrics (volatility and Sharpe ratio share one price download)
+        portfolio_volatility, sharpe_ratio = risk_metrics.result()
         
         return {
             'portfolio_id': portfolio_id,
-            'portfolio_name': portfolio[1],
+            'portfolio_name': portfolio['name'],
             'initial_capital': initial_capital,
             'current_value': current_value,
             'total_invested': total_invested,
@@ -322,53 +749,47 @@ class PortfolioManager:
             'last_updated': datetime.now().isoformat()
         }
     
-    def _calculate_portfolio_volatility(self, symbols, period='1y'):
-        """Calculate portfolio volatility"""
+    def _compute_risk_metrics(self, symbols, period='1y', risk_free_rate=0.02):
+        """Annualized volatility (%) and Sharpe ratio of an equal-weighted portfolio from one download"""
         try:
             if not symbols:
-                return 0
+                return 0, 0
             
-            # Download price data
-            data = yf.download(symbols, period=period, progress=False)['Close']
-            if isinstance(data, pd.Series):
-                returns = data.pct_change().dropna()
-                return returns.std() * np.sqrt(252) * 100  # Annualized volatility
-            else:
-                returns = data.pct_change().dropna()
-                # Equal weighted portfolio volatility
-                portfolio_returns = returns.mean(axis=1)
-                return portfolio_returns.std() * np.sqrt(252) * 100
-                
-        except:
-            return 0
-    
-    def _calculate_portfolio_sharpe(self, symbols, risk_free_rate=0.02):
-        """Calculate portfolio Sharpe ratio"""
-        try:
-            if not symbols:
-                return 0
+            # Download price data once for both metrics
+            data = yf.download(symbols, period=period, progress=False, session=MARKET_DATA_SESSION)['Close']
+            prices = data.to_numpy(dtype=np.float64).reshape(len(data), -1)
+            prices = prices[:, ~np.isnan(prices).all(axis=0)]  # Symbols with no history at all
             
-            # Download price data
-            data = yf.download(symbols, period='1y', progress=False)['Close']
-            if isinstance(data, pd.Series):
-                returns = data.pct_change().dropna()
-            else:
-                returns = data.pct_change().dropna().mean(axis=1)
+            # Daily simple returns, dropping days where any symbol is missing
+            returns = prices[1:] / prices[:-1] - 1
+            returns = returns[~np.isnan(returns).any(axis=1)]
+            if len(returns) < 2:
+                return 0, 0
+            
+            # Equal weighted portfolio returns
+            portfolio_returns = returns.mean(axis=1)
+            std = portfolio_returns.std(ddof=1)
             
-            excess_returns = returns - risk_free_rate/252
-            return (excess_returns.mean() / excess_returns.std()) * np.sqrt(252) if excess_returns.std() != 0 else 0
+            volatility = std * np.sqrt(252) * 100
+            sharpe_ratio = (portfolio_returns.mean() - risk_free_rate / 252) / std * np.sqrt(252) if std != 0 else 0
+            return volatility, sharpe_ratio
             
-        except:
-            return 0
+        except Exception as e:
+            logger.warning("Risk metrics for %s failed: %s: %s", ', '.join(symbols), type(e).__name__, e)
+            return 0, 0
     
+    @_serialized_write
     def delete_portfolio(self, portfolio_id):
         """Delete a portfolio and all its holdings"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         try:
+            cursor.execute('BEGIN IMMEDIATE')
+            
             # Delete holdings first
             cursor.execute('DELETE FROM holdings WHERE portfolio_id = ?', (portfolio_id,))
+            cursor.execute(DELETE_SNAPSHOT_SQL, (portfolio_id,))
             
             # Delete transactions
             cursor.execute('DELETE FROM transactions WHERE portfolio_id = ?', (portfolio_id,))
@@ -380,39 +801,26 @@ class PortfolioManager:
                 conn.commit()
                 return True, "Portfolio deleted successfully"
             else:
+                conn.rollback()
                 return False, "Portfolio not found"
                 
         except Exception as e:
+            conn.rollback()
             return False, str(e)
-        finally:
-            conn.close()
     
+    @_serialized_write
     def update_portfolio(self, portfolio_id, name=None, description=None):
         """Update portfolio details"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         try:
-            update_fields = []
-            params = []
-            
-            if name:
-                update_fields.append("name = ?")
-                params.append(name)
-            
-            if description is not None:
-                update_fields.append("description = ?")
-                params.append(description)
-            
-            if not update_fields:
+            # An empty name is ignored like a missing one
+            name = name or None
+            if name is None and description is None:
                 return False, "No fields to update"
             
-            update_fields.append("updated_date = ?")
-            params.append(datetime.now().isoformat())
-            params.append(portfolio_id)
-            
-            query = f"UPDATE portfolios SET {', '.join(update_fields)} WHERE id = ?"
-            cursor.execute(query, params)
+            cursor.execute(UPDATE_PORTFOLIO_SQL, (name, description, datetime.now().isoformat(), portfolio_id))
             
             if cursor.rowcount > 0:
                 conn.commit()
@@ -422,12 +830,19 @@ class PortfolioManager:
                 
         except Exception as e:
             return False, str(e)
-        finally:
-            conn.close()
+    
+    def get_portfolio_version(self, portfolio_id):
+        """Return the portfolio's updated_date, which changes with every write to its holdings"""
+        row = self._conn().execute('SELECT updated_date FROM portfolios WHERE id = ?', (portfolio_id,)).fetchone()
+        return row['updated_date'] if row else None
     
     def get_portfolio_holdings(self, portfolio_id):
         """Get detailed holdings for a portfolio"""
-        conn = sqlite3.connect(self.db_path)
+        return list(self.iter_holdings(portfolio_id))
+    
+    def iter_holdings(self, portfolio_id, page_size=HOLDINGS_PAGE_SIZE):
+        """Yield holdings entries page by page, so only one page of rows is held at a time"""
+        conn = self._conn()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -437,111 +852,97 @@ class PortfolioManager:
             ORDER BY h.purchase_date DESC
         ''', (portfolio_id,))
         
-        holdings_data = cursor.fetchall()
-        conn.close()
+        while True:
+            holdings_data = cursor.fetchmany(page_size)
+            if not holdings_data:
+                break
+            
+            # Current prices from one batched Yahoo Finance lookup per page; unpriced holdings report zeros
+            prices = self._get_prices([holding['symbol'] for holding in holdings_data])
+            for holding in holdings_data:
+                yield self._holding_row(holding, prices.get(holding['symbol']))
+    
+    def _holding_row(self, holding, current_price):
+        """Build a holdings entry, with market fields zeroed when there is no current price"""
+        shares = holding['shares']
+        avg_price = holding['avg_price']
+        cost_basis = shares * avg_price
         
-        holdings = []
-        for holding in holdings_data:
-            try:
-                symbol = holding[1]
-                shares = holding[2]
-                avg_price = holding[3]
-                
-                # Get current price from Yahoo Finance
-                stock = yf.Ticker(symbol)
-                current_price = stock.history(period='1d')['Close'].iloc[-1]
-                
-                market_value = shares * current_price
-                cost_basis = shares * avg_price
-                unrealized_pnl = market_value - cost_basis
-                
-                holdings.append({
-                    'id': holding[0],
-                    'symbol': symbol,
-                    'shares': shares,
-                    'avg_price': avg_price,
-                    'current_price': current_price,
-                    'market_value': market_value,
-                    'cost_basis': cost_basis,
-                    'unrealized_pnl': unrealized_pnl,
-                    'unrealized_pnl_percent': (unrealized_pnl / cost_basis) * 100 if cost_basis > 0 else 0,
-                    'purchase_date': holding[4]
-                })
-            except Exception as e:
-                # If Yahoo Finance fails, add holding with basic info
-                holdings.append({
-                    'id': holding[0],
-                    'symbol': holding[1],
-                    'shares': holding[2],
-                    'avg_price': holding[3],
-                    'current_price': 0,
-                    'market_value': 0,
-                    'cost_basis': holding[2] * holding[3],
-                    'unrealized_pnl': 0,
-                    'unrealized_pnl_percent': 0,
-                    'purchase_date': holding[4]
-                })
-        
-        return holdings
+        if current_price is None:
+            market_value = unrealized_pnl = unrealized_pnl_percent = current_price = 0
+        else:
+            market_value = shares * current_price
+            unrealized_pnl = market_value - cost_basis
+            unrealized_pnl_percent = (unrealized_pnl / cost_basis) * 100 if cost_basis > 0 else 0
+        
+        return {
+            'id': holding['id'],
+            'symbol': holding['symbol'],
+            'shares': shares,
+            'avg_price': avg_price,
+            'current_price': current_price,
+            'market_value': market_value,
+            'cost_basis': cost_basis,
+            'unrealized_pnl': unrealized_pnl,
+            'unrealized_pnl_percent': unrealized_pnl_percent,
+            'purchase_date': holding['purchase_date']
+        }
     
+    @_serialized_write
     def update_holding(self, holding_id, shares=None, avg_price=None):
         """Update a holding's shares or average price"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         try:
-            update_fields = []
-            params = []
-            
-            if shares is not None:
-                update_fields.append("shares = ?")
-                params.append(shares)
-            
-            if avg_price is not None:
-                update_fields.append("avg_price = ?")
-                params.append(avg_price)
-            
-            if not update_fields:
+            if shares is None and avg_price is None:
                 return False, "No fields to update"
             
-            params.append(holding_id)
-            
-            query = f"UPDATE holdings SET {', '.join(update_fields)} WHERE id = ?"
-            cursor.execute(query, params)
+            cursor.execute('BEGIN IMMEDIATE')
             
-            if cursor.rowcount > 0:
-                conn.commit()
-                return True, "Holding updated successfully"
-            else:
+            # RETURNING names the owning portfolio without a second lookup
+            row = cursor.execute(UPDATE_HOLDING_SQL, (shares, avg_price, holding_id)).fetchone()
+            if row is None:
+                conn.rollback()
                 return False, "Holding not found"
+            
+            # Drop the cached portfolio value and mark the portfolio changed
+            cursor.execute(DELETE_SNAPSHOT_SQL, (row['portfolio_id'],))
+            cursor.execute(TOUCH_PORTFOLIO_SQL, (datetime.now().isoformat(), row['portfolio_id']))
+            conn.commit()
+            return True, "Holding updated successfully"
                 
         except Exception as e:
+            conn.rollback()
             return False, str(e)
-        finally:
-            conn.close()
     
+    @_serialized_write
     def delete_holding(self, holding_id):
         """Delete a holding from portfolio"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         try:
-            cursor.execute('DELETE FROM holdings WHERE id = ?', (holding_id,))
+            cursor.execute('BEGIN IMMEDIATE')
             
-            if cursor.rowcount > 0:
-                conn.commit()
-                return True, "Holding deleted successfully"
-            else:
+            row = cursor.execute(DELETE_HOLDING_BY_ID_SQL, (holding_id,)).fetchone()
+            if row is None:
+                conn.rollback()
                 return False, "Holding not found"
+            
+            cursor.execute(DELETE_SNAPSHOT_SQL, (row['portfolio_id'],))
+            cursor.execute(TOUCH_PORTFOLIO_SQL, (datetime.now().isoformat(), row['portfolio_id']))
+            conn.commit()
+            return True, "Holding deleted successfully"
                 
         except Exception as e:
+            conn.rollback()
             return False, str(e)
-        finally:
-            conn.close()
     
+    @_serialized_write
     def remove_from_watchlist(self, item_id):
         """Remove item from watchlist"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         try:
@@ -555,10 +956,8 @@ class PortfolioManager:
                 
         except Exception as e:
             return False, str(e)
-        finally:
-            conn.close()
         """Add stock to watchlist"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         try:
@@ -572,12 +971,11 @@ class PortfolioManager:
             
         except Exception as e:
             return False, str(e)
-        finally:
-            conn.close()
     
+    @_serialized_write
     def add_to_watchlist(self, symbol, target_price=None, notes=''):
         """Add stock to watchlist"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
         try:
@@ -591,71 +989,218 @@ class PortfolioManager:
             
         except Exception as e:
             return False, str(e)
-        finally:
-            conn.close()
     
     def delete_watchlist_item(self, item_id):
         """Delete item from watchlist (alias for remove_from_watchlist)"""
         return self.remove_from_watchlist(item_id)
     
+    @_serialized_write
+    def delete_watchlist_items(self, item_ids):
+        """Remove several watchlist items with one DELETE"""
+        conn = self._conn()
+        cursor = conn.cursor()
+        
+        try:
+            if not item_ids:
+                return False, "No items to remove"
+            
+            placeholders = ', '.join('?' * len(item_ids))
+            cursor.execute(f'DELETE FROM watchlist WHERE id IN ({placeholders})', list(item_ids))
+            
+            if cursor.rowcount > 0:
+                return True, f"{cursor.rowcount} items removed from watchlist"
+            else:
+                return False, "Items not found"
+                
+        except Exception as e:
+            return False, str(e)
+    
     def get_watchlist(self):
         """Get watchlist with current prices and alerts"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conn()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM watchlist ORDER BY added_date DESC')
+        cursor.execute('SELECT id, symbol, target_price, notes, added_date, alert_enabled FROM watchlist ORDER BY added_date DESC')
         watchlist_items = cursor.fetchall()
-        conn.close()
         
-        watchlist = []
-        for item in watchlist_items:
-            try:
-                symbol = item[1]
-                stock = yf.Ticker(symbol)
-                current_price = stock.history(period='1d')['Close'].iloc[-1]
-                
-                watchlist_data = {
-                    'id': item[0],
-                    'symbol': symbol,
-                    'current_price': current_price,
-                    'target_price': item[2],
-                    'notes': item[3],
-                    'added_date': item[4],
-                    'alert_enabled': bool(item[5])
-                }
-                
-                # Calculate alert status
-                if item[2]:  # If target price is set
-                    if current_price >= item[2]:
-                        watchlist_data['alert_status'] = 'TARGET_REACHED'
-                        watchlist_data['alert_message'] = f'Price reached target of ${item[2]:.2f}'
-                    else:
-                        pct_to_target = ((item[2] - current_price) / current_price) * 100
-                        watchlist_data['alert_status'] = 'MONITORING'
-                        watchlist_data['alert_message'] = f'{pct_to_target:.1f}% to target'
+        prices = self._get_prices([item['symbol'] for item in watchlist_items])
+        
+        # Items without a current price are skipped
+        watchlist = [self._watchlist_row(item, prices[item['symbol']]) for item in watchlist_items if item['symbol'] in prices]
+        return [row for row in watchlist if row is not None]
+    
+    def _watchlist_row(self, item, current_price):
+        """Build a watchlist entry with its alert status, or None if the item is malformed"""
+        try:
+            target_price = item['target_price']
+            watchlist_data = {
+                'id': item['id'],
+                'symbol': item['symbol'],
+                'current_price': current_price,
+                'target_price': target_price,
+                'notes': item['notes'],
+                'added_date': item['added_date'],
+                'alert_enabled': bool(item['alert_enabled'])
+            }
+            
+            # Calculate alert status
+            if target_price:  # If target price is set
+                if current_price >= target_price:
+                    watchlist_data['alert_status'] = 'TARGET_REACHED'
+                    watchlist_data['alert_message'] = f'Price reached target of ${target_price:.2f}'
                 else:
-                    watchlist_data['alert_status'] = 'NO_TARGET'
-                    watchlist_data['alert_message'] = 'No target price set'
-                
-                watchlist.append(watchlist_data)
-                
-            except Exception as e:
-                continue  # Skip items with errors
+                    pct_to_target = ((target_price - current_price) / current_price) * 100
+                    watchlist_data['alert_status'] = 'MONITORING'
+                    watchlist_data['alert_message'] = f'{pct_to_target:.1f}% to target'
+            else:
+                watchlist_data['alert_status'] = 'NO_TARGET'
+                watchlist_data['alert_message'] = 'No target price set'
+            
+            return watchlist_data
+            
+        except Exception as e:
+            logger.debug("Skipping watchlist item: %s: %s", type(e).__name__, e)
+            return None  # Skip items with errors
+    
+    def _solve_min_variance(self, expected_returns, cov_matrix, target_return, max_weight=MAX_ASSET_WEIGHT):
+        """Minimum-variance weights reaching target_return with 0 <= w <= max_weight, or None"""
+        mu = np.asarray(expected_returns, dtype=np.float64)
+        cov = np.asarray(cov_matrix, dtype=np.float64)
+        num_assets = len(mu)
         
-        return watchlist
+        # Without the bounds the problem has a closed form; when that solution already lies
+        # inside the bounds it is also the bounded optimum and no iterative solver is needed
+        weights = self._solve_min_variance_unbounded(mu, cov, target_return)
+        if weights is not None and weights.min() >= -1e-10 and weights.max() <= max_weight + 1e-10:
+            return np.clip(weights, 0, max_weight)
+        
+        # The problem is a convex QP, so a dedicated QP solver is used when available
+        if cp is not None:
+            w = cp.Variable(num_assets)
+            problem = cp.Problem(
+                cp.Minimize(cp.quad_form(w, cp.psd_wrap(cov))),
+                [cp.sum(w) == 1, mu @ w == target_return, w >= 0, w <= max_weight]
+            )
+            for solver in QP_SOLVERS:
+                try:
+                    problem.solve(solver=solver)
+                except cp.error.SolverError:
+                    continue
+                if problem.status in (cp.INFEASIBLE, cp.INFEASIBLE_INACCURATE):
+                    return None
+                if problem.status in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE) and w.value is not None:
+                    return np.clip(w.value, 0, max_weight)
+        
+        # Optimization constraints (linear, so their Jacobians are constant)
+        ones = np.ones(num_assets)
+        constraints = [
+            {'type': 'eq', 'fun': lambda x: ones @ x - 1, 'jac': lambda x: ones},  # Weights sum to 1
+            {'type': 'eq', 'fun': lambda x: mu @ x - target_return, 'jac': lambda x: mu}  # Target return
+        ]
+        
+        # Bounds for weights (0 to 40% per asset)
+        bounds = tuple((0, max_weight) for _ in range(num_assets))
+        
+        # Initial guess (equal weights)
+        x0 = np.array([1/num_assets] * num_assets)
+        
+        # Objective function: minimize portfolio variance, w'Σw = |L'w|² with Σ = LL'
+        try:
+            factor = np.linalg.cholesky(cov).T
+        except np.linalg.LinAlgError:  # Singular covariance (e.g. duplicated series)
+            factor = None
+        
+        def portfolio_variance(weights):
+            if factor is None:
+                return weights @ cov @ weights
+            z = factor @ weights
+            return z @ z
+        
+        def portfolio_variance_grad(weights):
+            return 2 * (cov @ weights)
+        
+        result = sco.minimize(portfolio_variance, x0, method='SLSQP', jac=portfolio_variance_grad,
+                            bounds=bounds, constraints=constraints)
+        return result.x if result.success else None
+    
+    def _solve_min_variance_unbounded(self, mu, cov, target_return):
+        """Closed-form weights for min w'Σw s.t. sum(w) = 1, mu'w = target_return, or None"""
+        try:
+            cho = linalg.cho_factor(cov)
+        except (linalg.LinAlgError, ValueError):  # Singular or non-finite covariance
+            return None
+        
+        # w = Σ⁻¹A(A'Σ⁻¹A)⁻¹b with A = [1, mu] and b = [1, target_return]
+        A = np.column_stack((np.ones_like(mu), mu))
+        inv_cov_A = linalg.cho_solve(cho, A)
+        try:
+            multipliers = np.linalg.solve(A.T @ inv_cov_A, np.array([1.0, target_return]))
+        except np.linalg.LinAlgError:  # Identical expected returns
+            return None
+        return inv_cov_A @ multipliers
+    
+    def _fetch_close_history(self, symbol, period):
+        """One symbol's daily closes on a tz-naive date index (as yf.download aligns them)"""
+        try:
+            closes = self._get_ticker(symbol).history(period=period)['Close'].dropna()
+        except Exception as e:
+            logger.debug("History fetch for %s failed: %s: %s", symbol, type(e).__name__, e)
+            return pd.Series(dtype=np.float64)
+        if closes.empty or not isinstance(closes.index, pd.DatetimeIndex):
+            return pd.Series(dtype=np.float64)  # Unknown or delisted: yfinance returns a frame without dates
+        closes.index = closes.index.tz_localize(None)
+        return closes
+    
+    def _get_close_history(self, symbols, period):
+        """Daily closes for symbols as one date-aligned frame, columns in symbol order"""
+        day = datetime.now().date().isoformat()
+        closes = {}
+        missing = []
+        for symbol in symbols:
+            series = _history_cache.get((symbol, period, day))
+            if series is None:
+                missing.append(symbol)
+            else:
+                closes[symbol] = series
+        
+        if missing:
+            # One history request per symbol on the shared pool, so latency is the slowest symbol
+            fetched = _price_pool.map(lambda symbol: self._fetch_close_history(symbol, period), missing)
+            for symbol, series in zip(missing, fetched):
+                if len(series):  # Empty downloads are retried on the next request
+                    _history_cache.set((symbol, period, day), series)
+                closes[symbol] = series
+        
+        # Re-aligning on the union of dates restores the gaps a joint download would have
+        return pd.concat({symbol: closes[symbol] for symbol in sorted(closes)}, axis=1)
     
     def optimize_portfolio(self, symbols, target_return=None, risk_tolerance='moderate'):
         """Optimize portfolio allocation using Modern Portfolio Theory"""
         try:
-            # Download historical data
-            data = yf.download(symbols, period='2y', progress=False)['Close']
-            returns = data.pct_change().dropna()
+            # Inside the try: malformed symbols or target_return fail here as an error result
+            cache_key = (tuple(sorted(symbols)), target_return, risk_tolerance, datetime.now().date().isoformat())
+            cached = _opt_cache.get(cache_key)
+            if cached is not None:
+                return cached
             
-            # Calculate expected returns and covariance matrix
-            expected_returns = returns.mean() * 252  # Annualized
-            cov_matrix = returns.cov() * 252  # Annualized
+            # A covariance needs at least two assets and two days of returns
+            if len(symbols) < 2:
+                return {'success': False, 'error': 'Optimization failed'}
             
-            num_assets = len(symbols)
+            # Historical closes (only symbols not cached today are downloaded)
+            data = self._get_close_history(symbols, period='2y')
+            returns = data.dropna(axis=1, how='all').pct_change().dropna()  # Unknown symbols have no history
+            
+            if returns.shape[0] < 2 or returns.shape[1] < 2:
+                return {'success': False, 'error': 'Optimization failed'}
+            
+            # Weights follow the downloaded column order, which need not match the request
+            symbols = [str(symbol) for symbol in returns.columns]
+            R = np.ascontiguousarray(returns.to_numpy(dtype=np.float64))
+            
+            # Calculate expected returns and covariance matrix
+            expected_returns = R.mean(axis=0) * 252  # Annualized
+            cov_matrix = np.atleast_2d(np.cov(R, rowvar=False, ddof=1)) * 252  # Annualized
             
             # Risk tolerance settings
             risk_settings = {
@@ -669,51 +1214,35 @@ class PortfolioManager:
             if target_return is None:
                 target_return = settings['target_return']
             
-            # Optimization constraints
-            constraints = [
-                {'type': 'eq', 'fun': lambda x: np.sum(x) - 1},  # Weights sum to 1
-                {'type': 'eq', 'fun': lambda x: np.sum(x * expected_returns) - target_return}  # Target return
-            ]
-            
-            # Bounds for weights (0 to 40% per asset)
-            bounds = tuple((0, 0.4) for _ in range(num_assets))
-            
-            # Initial guess (equal weights)
-            x0 = np.array([1/num_assets] * num_assets)
-            
-            # Objective function: minimize portfolio variance
-            def portfolio_variance(weights):
-                return np.dot(weights.T, np.dot(cov_matrix, weights))
-            
             # Optimize
-            result = sco.minimize(portfolio_variance, x0, method='SLSQP', 
-                                bounds=bounds, constraints=constraints)
+            optimal_weights = self._solve_min_variance(expected_returns, cov_matrix, target_return)
             
-            if result.success:
-                optimal_weights = result.x
-                
+            if optimal_weights is not None:
                 # Calculate portfolio metrics
-                portfolio_return = np.sum(optimal_weights * expected_returns)
-                portfolio_volatility = np.sqrt(np.dot(optimal_weights.T, np.dot(cov_matrix, optimal_weights)))
+                portfolio_return = optimal_weights @ expected_returns
+                portfolio_volatility = np.sqrt(optimal_weights @ cov_matrix @ optimal_weights)
                 sharpe_ratio = portfolio_return / portfolio_volatility if portfolio_volatility > 0 else 0
                 
+                # Plain floats, weights rounded to 6 places (well below any displayed precision)
+                weights = optimal_weights.round(6).tolist()
                 optimization_result = {
                     'success': True,
                     'symbols': symbols,
-                    'weights': optimal_weights.tolist(),
-                    'expected_return': portfolio_return,
-                    'volatility': portfolio_volatility,
-                    'sharpe_ratio': sharpe_ratio,
+                    'weights': weights,
+                    'expected_return': float(portfolio_return),
+                    'volatility': float(portfolio_volatility),
+                    'sharpe_ratio': float(sharpe_ratio),
                     'allocations': [
                         {
                             'symbol': symbol,
                             'weight': weight,
-                            'allocation_pct': weight * 100
+                            'allocation_pct': round(weight * 100, 4)
                         }
-                        for symbol, weight in zip(symbols, optimal_weights)
+                        for symbol, weight in zip(symbols, weights)
                     ]
                 }
                 
+                _opt_cache.set(cache_key, optimization_result)
                 return optimization_result
             else:
                 return {'success': False, 'error': 'Optimization failed'}
@@ -726,8 +1255,52 @@ portfolio_manager = PortfolioManager('portfolio_management.db')
 
 # Flask API for portfolio management
 app = Flask(__name__)
+app.json = OrjsonProvider(app)  # orjson for every jsonify() response
 CORS(app)
 
+# Brotli/gzip for JSON bodies over 500 bytes; NDJSON streams are left unbuffered
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 500
+app.config['COMPRESS_STREAMS'] = False
+Compress(app)
+
+# Encoded list/watchlist responses absorb UI polling for a few seconds; any write clears them
+RESPONSE_CACHE_SECONDS = 5
+_response_cache = TTLCache(maxsize=16, ttl=RESPONSE_CACHE_SECONDS)
+
+def cached_json_response(key, build):
+    """Serve a GET payload from the response cache, building and encoding it with orjson on a miss"""
+    body = _response_cache.get(key)
+    if body is None:
+        body = dumps_json(build())
+        _response_cache.set(key, body)
+    return app.response_class(body, mimetype='application/json')
+
+# Accepted JSON types for numeric body fields
+NUMBER = (int, float)
+
+def parse_body_fields(**field_types):
+    """Optional typed fields of the JSON request body; raises ValueError naming the first bad one"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    
+    values = []
+    for key, expected in field_types.items():
+        value = data.get(key)
+        # bool is an int subclass but never a valid number here
+        if value is not None and (isinstance(value, bool) or not isinstance(value, expected)):
+            raise ValueError(f'{key} must be {"a number" if expected is NUMBER else "a string"}')
+        values.append(value)
+    return values
+
+@app.after_request
+def invalidate_response_cache(response):
+    """Drop cached GET responses after any request that may have changed data"""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        _response_cache.clear()
+    return response
+
 @app.route('/api/portfolio/create', methods=['POST'])
 def create_portfolio():
     """Create a new portfolio"""
@@ -746,8 +1319,7 @@ def create_portfolio():
 @app.route('/api/portfolio/list', methods=['GET'])
 def list_portfolios():
     """Get all portfolios"""
-    portfolios = portfolio_manager.get_portfolios()
-    return jsonify({'success': True, 'portfolios': portfolios})
+    return cached_json_response('portfolios', lambda: {'success': True, 'portfolios': portfolio_manager.get_portfolios()})
 
 @app.route('/api/portfolio/<int:portfolio_id>/performance', methods=['GET'])
 def get_portfolio_performance(portfolio_id):
@@ -792,8 +1364,7 @@ def add_to_watchlist():
 @app.route('/api/watchlist', methods=['GET'])
 def get_watchlist():
     """Get watchlist"""
-    watchlist = portfolio_manager.get_watchlist()
-    return jsonify({'success': True, 'watchlist': watchlist})
+    return cached_json_response('watchlist', lambda: {'success': True, 'watchlist': portfolio_manager.get_watchlist()})
 
 @app.route('/api/watchlist/<int:item_id>', methods=['DELETE'])
 def delete_watchlist_item(item_id):
@@ -805,12 +1376,30 @@ def delete_watchlist_item(item_id):
     else:
         return jsonify({'success': False, 'error': message}), 400
 
+@app.route('/api/watchlist/bulk_delete', methods=['POST'])
+def delete_watchlist_items():
+    """Delete several items from watchlist"""
+    data = request.get_json()
+    item_ids = data.get('ids', [])
+    
+    # bool is an int subclass but never a valid id here
+    if not isinstance(item_ids, list) or not all(isinstance(item_id, int) and not isinstance(item_id, bool) for item_id in item_ids):
+        return jsonify({'success': False, 'error': 'ids must be a list of integers'}), 400
+    
+    success, message = portfolio_manager.delete_watchlist_items(item_ids)
+    
+    if success:
+        return jsonify({'success': True, 'message': message})
+    else:
+        return jsonify({'success': False, 'error': message}), 400
+
 @app.route('/api/portfolio/<int:portfolio_id>', methods=['PUT'])
 def update_portfolio(portfolio_id):
     """Update portfolio details"""
-    data = request.get_json()
-    name = data.get('name')
-    description = data.get('description')
+    try:
+        name, description = parse_body_fields(name=str, description=str)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     success, message = portfolio_manager.update_portfolio(portfolio_id, name, description)
     
@@ -831,28 +1420,38 @@ def delete_portfolio(portfolio_id):
 
 @app.route('/api/portfolio/<int:portfolio_id>/holdings', methods=['GET'])
 def get_portfolio_holdings(portfolio_id):
-    """Get portfolio holdings"""
-    holdings = portfolio_manager.get_portfolio_holdings(portfolio_id)
-    return jsonify({'success': True, 'holdings': holdings})
-
-@app.route('/api/portfolio/<int:portfolio_id>/holding/<int:holding_id>', methods=['PUT'])
-def update_holding(portfolio_id, holding_id):
-    """Update holding in portfolio"""
-    data = request.get_json()
-    shares = data.get('shares')
-    avg_price = data.get('avg_price')
+    """Get portfolio holdings (one JSON object per line when the client accepts NDJSON)"""
+    ndjson = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
     
-    success, message = portfolio_manager.update_holding(holding_id, shares, avg_price)
+    # The payload changes with the holdings (portfolio version) and with prices (cache window)
+    version = portfolio_manager.get_portfolio_version(portfolio_id)
+    etag = f'{portfolio_id}-{version}-{int(time.time() // PRICE_CACHE_SECONDS)}' + ('-ndjson' if ndjson else '')
     
-    if success:
-        return jsonify({'success': True, 'message': message})
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    elif ndjson:
+        # Stream rows as they are read instead of encoding the whole list first
+        rows = (dumps_json(holding) + b'\n' for holding in portfolio_manager.iter_holdings(portfolio_id))
+        response = app.response_class(stream_with_context(rows), mimetype='application/x-ndjson')
     else:
-        return jsonify({'success': False, 'error': message}), 400
+        holdings = portfolio_manager.get_portfolio_holdings(portfolio_id)
+        response = jsonify({'success': True, 'holdings': holdings})
+    
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept')
+    return response
 
-@app.route('/api/portfolio/<int:portfolio_id>/holding/<int:holding_id>', methods=['DELETE'])
-def delete_holding(portfolio_id, holding_id):
-    """Delete holding from portfolio"""
-    success, message = portfolio_manager.delete_holding(holding_id)
+@app.route('/api/portfolio/<int:portfolio_id>/holding/<int:holding_id>', methods=['PUT', 'DELETE'])
+def holding_detail(portfolio_id, holding_id):
+    """Update (PUT) or delete (DELETE) a holding in portfolio"""
+    if request.method == 'PUT':
+        try:
+            shares, avg_price = parse_body_fields(shares=NUMBER, avg_price=NUMBER)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        success, message = portfolio_manager.update_holding(holding_id, shares, avg_price)
+    else:
+        success, message = portfolio_manager.delete_holding(holding_id)
     
     if success:
         return jsonify({'success': True, 'message': message})
@@ -862,29 +1461,47 @@ def delete_holding(portfolio_id, holding_id):
 @app.route('/api/portfolio/optimize', methods=['POST'])
 def optimize_portfolio():
     """Optimize portfolio allocation"""
-    data = request.get_json()
-    symbols = data.get('symbols', [])
-    target_return = data.get('target_return')
-    risk_tolerance = data.get('risk_tolerance', 'moderate')
+    try:
+        target_return, risk_tolerance = parse_body_fields(target_return=NUMBER, risk_tolerance=str)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
-    result = portfolio_manager.optimize_portfolio(symbols, target_return, risk_tolerance)
+    symbols = request.get_json().get('symbols')
+    if not isinstance(symbols, list) or not symbols or not all(isinstance(symbol, str) for symbol in symbols):
+        return jsonify({'success': False, 'error': 'symbols must be a non-empty list of strings'}), 400
+    
+    # Same symbol set -> same cache entry, whatever the casing, order or repeats
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    
+    result = portfolio_manager.optimize_portfolio(symbols, target_return, risk_tolerance or 'moderate')
     return jsonify(result)
 
 if __name__ == '__main__':
-    print("🏦 Portfolio Management API starting...")
-    print(" Available endpoints:")
-    print("  POST /api/portfolio/create - Create portfolio")
-    print("  GET  /api/portfolio/list - List portfolios")
-    print("  PUT  /api/portfolio/<id> - Update portfolio")
-    print("  DELETE /api/portfolio/<id> - Delete portfolio")
-    print("  GET  /api/portfolio/<id>/performance - Portfolio performance")
-    print("  GET  /api/portfolio/<id>/holdings - Get portfolio holdings")
-    print("  POST /api/portfolio/<id>/add - Add stock to portfolio")
-    print("  PUT  /api/portfolio/<id>/holding/<holding_id> - Update holding")
-    print("  DELETE /api/portfolio/<id>/holding/<holding_id> - Delete holding")
-    print("  POST /api/watchlist/add - Add to watchlist")
-    print("  GET  /api/watchlist - Get watchlist")
-    print("  DELETE /api/watchlist/<id> - Remove from watchlist")
-    print("  POST /api/portfolio/optimize - Optimize portfolio")
-    
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    
+    ENDPOINTS = (
+        "POST /api/portfolio/create - Create portfolio",
+        "GET  /api/portfolio/list - List portfolios",
+        "PUT  /api/portfolio/<id> - Update portfolio",
+        "DELETE /api/portfolio/<id> - Delete portfolio",
+        "GET  /api/portfolio/<id>/performance - Portfolio performance",
+        "GET  /api/portfolio/<id>/holdings - Get portfolio holdings",
+        "POST /api/portfolio/<id>/add - Add stock to portfolio",
+        "PUT  /api/portfolio/<id>/holding/<holding_id> - Update holding",
+        "DELETE /api/portfolio/<id>/holding/<holding_id> - Delete holding",
+        "POST /api/watchlist/add - Add to watchlist",
+        "GET  /api/watchlist - Get watchlist",
+        "DELETE /api/watchlist/<id> - Remove from watchlist",
+        "POST /api/watchlist/bulk_delete - Remove several watchlist items",
+        "POST /api/portfolio/optimize - Optimize portfolio",
+    )
+    logger.info("\n".join((
+        "🏦 Portfolio Management API starting...",
+        " Available endpoints:",
+        *(f"  {endpoint}" for endpoint in ENDPOINTS),
+        "Development server only; for production run:",
+        "  gunicorn -w 4 -k gthread --threads 8 -b 0.0.0.0:5001 portfolio_manager:app",
+    )))
+    
+    # Debugger and reloader only when DEV is set
+    app.run(debug=bool(os.getenv('DEV')), host='0.0.0.0', port=5001, threaded=True)
@@ -38,7 +38,7 @@ class PredictionAPI {
         }
     }
 
-    async generatePrediction(symbol, days = 7, modelType = 'Random Forest') {
+    async generatePrediction(symbol, days = 7, modelType = 'Gradient Boosting') {
         // Clear cache to always get fresh predictions for debugging
         const today = new Date().toISOString().split('T')[0];
         const cacheKey = `${symbol}_${days}_${modelType}_${today}`;
@@ -55,13 +55,21 @@ class PredictionAPI {
 
             console.log('Sending prediction request:', requestData);
 
-            const response = await axios.post(`${ML_API_BASE_URL}/predict`, requestData, {
+            const postPrediction = () => axios.post(`${ML_API_BASE_URL}/predict`, requestData, {
                 timeout: 30000, // 30 seconds timeout for ML processing
                 headers: {
                     'Content-Type': 'application/json'
                 }
             });
 
+            let response = await postPrediction();
+
+            // 202 means the model is still training on the server: wait for it, then ask again
+            if (response.status === 202) {
+                await this.waitForTraining(requestData.symbol, modelType);
+                response = await postPrediction();
+            }
+
             console.log('Received prediction response:', response.status, response.statusText);
             console.log('Prediction data:', response.data);
             console.log(`Successfully generated REAL prediction for ${symbol}!`);
@@ -105,6 +113,28 @@ class PredictionAPI {
         }
     }
 
+    // Poll the training status endpoint until the model for a symbol is ready
+    async waitForTraining(symbol, modelType, intervalMs = 1000, maxAttempts = 60) {
+        for (let attempt = 0; attempt < maxAttempts; attempt++) {
+            const response = await axios.get(`${ML_API_BASE_URL}/predict_status/${symbol}`, {
+                params: { model_type: modelType },
+                timeout: 5000,
+                validateStatus: status => status < 600
+            });
+
+            if (response.data.status === 'ready') {
+                return response.data;
+            }
+            if (response.data.status === 'failed' || response.data.status === 'not_started') {
+                throw new Error(response.data.error || `Model training ${response.data.status}`);
+            }
+
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+
+        throw new Error('Timed out waiting for model training');
+    }
+
     // Get technical indicators from ML API
     async getTechnicalIndicators(symbol) {
         try {
@@ -146,7 +176,7 @@ class PredictionAPI {
     }
 
     // Generate mock prediction as fallback
-    generateMockPrediction(symbol, days = 7, modelType = 'Random Forest') {
+    generateMockPrediction(symbol, days = 7, modelType = 'Gradient Boosting') {
         console.log(`Generating mock prediction for ${symbol} (${days} days)`);
 
         // Generate mock predictions
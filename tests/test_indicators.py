@@ -0,0 +1,62 @@
+"""
+Tests for the technical indicator kernels (run with: python -m unittest discover tests)
+"""
+
+import unittest
+
+import numpy as np
+import pandas as pd
+import ta
+
+import indicators
+
+
+def closes(size=300, gaps=(120,)):
+    """Random-walk closes with NaN at the given positions"""
+    rng = np.random.default_rng(7)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.01, size))
+    close[list(gaps)] = np.nan
+    return close
+
+
+class BollingerBandsTest(unittest.TestCase):
+
+    def assert_matches_ta(self, close):
+        bands = ta.volatility.BollingerBands(pd.Series(close), window=20, window_dev=2)
+        upper, middle, lower = indicators.bbands(close, 20, 2.0)
+        np.testing.assert_allclose(upper, bands.bollinger_hband().to_numpy(), rtol=1e-9)
+        np.testing.assert_allclose(middle, bands.bollinger_mavg().to_numpy(), rtol=1e-9)
+        np.testing.assert_allclose(lower, bands.bollinger_lband().to_numpy(), rtol=1e-9)
+
+    def test_matches_ta_on_clean_input(self):
+        self.assert_matches_ta(closes(gaps=()))
+
+    def test_recovers_after_nan_gap_like_ta(self):
+        close = closes(gaps=(120, 200, 201))
+        self.assert_matches_ta(close)
+        self.assertFalse(np.isnan(indicators.bbands(close, 20, 2.0)[1][-1]))
+
+
+class ExponentialAverageTest(unittest.TestCase):
+
+    def assert_matches_ta(self, close):
+        series = pd.Series(close)
+        np.testing.assert_allclose(indicators.ema(close, 12), ta.trend.ema_indicator(series, 12).to_numpy(), rtol=1e-9)
+
+        ema_fast, ema_slow, macd, signal, hist = indicators.macd_fused(close, 12, 26, 9)
+        expected = ta.trend.MACD(series, window_slow=26, window_fast=12, window_sign=9)
+        np.testing.assert_allclose(ema_fast, ta.trend.ema_indicator(series, 12).to_numpy(), rtol=1e-9)
+        np.testing.assert_allclose(ema_slow, ta.trend.ema_indicator(series, 26).to_numpy(), rtol=1e-9)
+        np.testing.assert_allclose(macd, expected.macd().to_numpy(), rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(signal, expected.macd_signal().to_numpy(), rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(hist, expected.macd_diff().to_numpy(), rtol=1e-9, atol=1e-12)
+
+    def test_matches_ta_on_clean_input(self):
+        self.assert_matches_ta(closes(gaps=()))
+
+    def test_matches_ta_across_nan_gaps(self):
+        self.assert_matches_ta(closes(gaps=(5, 120, 200, 201, 202)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests for the Stock Prediction ML API (run with: python -m unittest discover tests)
+"""
+
+import unittest
+from unittest import mock
+
+import ml_api_server
+
+
+class TrainingStatusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.predictor = ml_api_server.StockPredictor()
+        self.client = ml_api_server.app.test_client()
+        self.original_predictor = ml_api_server.predictor
+        ml_api_server.predictor = self.predictor
+
+        # Stand-in training job: caches a placeholder model entry without downloading data
+        def fake_train(symbol, model_type=ml_api_server.DEFAULT_MODEL_TYPE):
+            self.predictor._models.set((symbol.upper(), model_type), (None,) * 6)
+            return True, {'train_accuracy': 1.0, 'test_accuracy': 1.0, 'data_points': 100}
+
+        self.predictor.train_model = fake_train
+
+    def tearDown(self):
+        ml_api_server.predictor = self.original_predictor
+
+    def train(self, symbol):
+        """Run one training job to completion, done callbacks included"""
+        future = self.predictor.start_training(symbol)
+        self.predictor._train_pool.shutdown(wait=True)
+        return future
+
+    def test_finished_job_is_forgotten_once_model_is_cached(self):
+        self.train('AAPL')
+        self.assertEqual(self.predictor._training_futures, {})
+        self.assertEqual(self.predictor.training_status('AAPL'), ('ready', None))
+
+    def test_evicted_model_reports_not_started(self):
+        self.train('AAPL')
+        self.predictor._models.clear()
+
+        self.assertEqual(self.predictor.training_status('AAPL'), ('not_started', None))
+        response = self.client.get('/api/predict_status/AAPL')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json()['status'], 'not_started')
+
+    def test_evicted_model_with_retained_future_reports_not_started(self):
+        # A successful job whose model expired before its entry was dropped
+        future = self.train('MSFT')
+        self.predictor._models.clear()
+        with self.predictor._training_lock:
+            self.predictor._training_futures[('MSFT', ml_api_server.DEFAULT_MODEL_TYPE)] = future
+
+        self.assertEqual(self.predictor.training_status('MSFT'), ('not_started', None))
+
+    def test_failed_training_is_reported(self):
+        self.predictor.train_model = lambda symbol, model_type: (False, 'Failed to download stock data')
+        self.train('BAD')
+
+        response = self.client.get('/api/predict_status/BAD')
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.get_json()['error'], 'Failed to download stock data')
+
+
+class CompileModelTest(unittest.TestCase):
+
+    def test_gradient_boosting_is_not_exported(self):
+        predictor = ml_api_server.StockPredictor()
+        model = predictor.build_model('Gradient Boosting')
+        with mock.patch.object(ml_api_server, 'convert_sklearn', create=True) as convert:
+            self.assertIsNone(predictor.compile_model(model, 10))
+        convert.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,327 @@
+"""
+Tests for the Portfolio Management API (run with: python -m unittest discover tests)
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from yfinance import utils as yf_utils
+
+pm = None
+
+
+def setUpModule():
+    """Import portfolio_manager from a scratch directory (it opens its default database on import)"""
+    global pm, _scratch_dir
+    _scratch_dir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(_scratch_dir)
+    try:
+        import portfolio_manager
+    finally:
+        os.chdir(cwd)
+    pm = portfolio_manager
+
+
+def tearDownModule():
+    shutil.rmtree(_scratch_dir, ignore_errors=True)
+
+
+class PortfolioTestCase(unittest.TestCase):
+    """Fresh PortfolioManager on its own database file for every test"""
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.manager = pm.PortfolioManager(os.path.join(self.db_dir, 'portfolio.db'))
+        _, self.portfolio_id = self.manager.create_portfolio('Test', '', 10000)
+
+    def tearDown(self):
+        self.manager._conn().close()
+        shutil.rmtree(self.db_dir, ignore_errors=True)
+
+    def holdings(self):
+        rows = self.manager._conn().execute(
+            'SELECT symbol, shares, avg_price FROM holdings WHERE portfolio_id = ? ORDER BY symbol',
+            (self.portfolio_id,)
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def transaction_count(self):
+        return self.manager._conn().execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+
+class AddTransactionsBulkTest(PortfolioTestCase):
+
+    def test_sell_before_buy_is_rejected(self):
+        success, message = self.manager.add_transactions_bulk(
+            self.portfolio_id, [('AAPL', 'SELL', 5, 100), ('AAPL', 'BUY', 5, 100)]
+        )
+        self.assertFalse(success)
+        self.assertIn('Insufficient shares', message)
+        self.assertEqual(self.holdings(), [])
+        self.assertEqual(self.transaction_count(), 0)
+
+    def test_closing_a_position_resets_cost_basis(self):
+        self.manager.add_transactions_bulk(self.portfolio_id, [('AAPL', 'BUY', 6, 100)])
+        success, _ = self.manager.add_transactions_bulk(
+            self.portfolio_id, [('AAPL', 'SELL', 6, 120), ('AAPL', 'BUY', 6, 200)]
+        )
+        self.assertTrue(success)
+        self.assertEqual(self.holdings(), [('AAPL', 6.0, 200.0)])
+
+    def test_buys_average_in_order(self):
+        success, _ = self.manager.add_transactions_bulk(
+            self.portfolio_id, [('msft', 'buy', 2, 10), ('MSFT', 'BUY', 2, 20), ('MSFT', 'SELL', 1, 50)]
+        )
+        self.assertTrue(success)
+        self.assertEqual(self.holdings(), [('MSFT', 3.0, 15.0)])
+
+    def test_invalid_rows_are_rejected(self):
+        for row in (('AAPL', 'BUY', 0, 100), ('AAPL', 'BUY', -3, 100), ('AAPL', 'HOLD', 1, 100)):
+            success, _ = self.manager.add_transactions_bulk(self.portfolio_id, [('MSFT', 'BUY', 1, 10), row])
+            self.assertFalse(success, row)
+        self.assertEqual(self.holdings(), [])
+        self.assertEqual(self.transaction_count(), 0)
+
+
+class GetPortfoliosTest(PortfolioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        pm._price_cache.clear()
+        self.price_lookups = []
+        self.manager._get_prices = self.fake_prices
+
+    def fake_prices(self, symbols):
+        self.price_lookups.append(sorted(symbols))
+        prices = {symbol: 150.0 for symbol in symbols}
+        for symbol, price in prices.items():
+            pm._price_cache.set(symbol, price)
+        return prices
+
+    def test_recomputed_values_are_stored_as_snapshots(self):
+        self.manager.add_transactions_bulk(self.portfolio_id, [('AAPL', 'BUY', 10, 100)])
+        pm._price_cache.clear()
+        self.manager._conn().execute('DELETE FROM portfolio_snapshots')
+
+        first = self.manager.get_portfolios()
+        self.assertEqual(self.price_lookups, [['AAPL']])
+        self.assertEqual((first[0]['current_value'], first[0]['total_return']), (1500.0, -85.0))
+
+        # Served from the snapshot: no second holdings scan or price lookup
+        self.assertEqual(self.manager.get_portfolios(), first)
+        self.assertEqual(self.price_lookups, [['AAPL']])
+
+
+class LastPriceTest(PortfolioTestCase):
+    """_last_price reads the chart metadata and falls back to history (no network)"""
+
+    def setUp(self):
+        super().setUp()
+        self.session = mock.Mock()
+        patcher = mock.patch.object(pm, 'MARKET_DATA_SESSION', self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ticker = mock.Mock()
+        self.ticker.history.return_value = pd.DataFrame({'Close': [101.0, np.nan]})
+        self.manager._get_ticker = lambda symbol: self.ticker
+
+    def chart(self, payload):
+        self.session.get.return_value.json.return_value = {'chart': payload}
+
+    def test_price_comes_from_chart_metadata(self):
+        self.chart({'result': [{'meta': {'regularMarketPrice': 187.5}}], 'error': None})
+        self.assertEqual(self.manager._last_price('AAPL'), 187.5)
+        self.ticker.history.assert_not_called()
+
+    def test_unknown_symbol_has_no_price(self):
+        self.chart({'result': None, 'error': {'code': 'Not Found'}})
+        self.assertIsNone(self.manager._last_price('ZZZZ'))
+        self.ticker.history.assert_not_called()
+
+    def test_failed_chart_lookup_falls_back_to_history(self):
+        self.session.get.side_effect = ConnectionError('reset')
+        self.assertEqual(self.manager._last_price('AAPL'), 101.0)
+
+    def test_missing_chart_price_falls_back_to_history(self):
+        self.chart({'result': [{'meta': {}}], 'error': None})
+        self.assertEqual(self.manager._last_price('AAPL'), 101.0)
+
+
+class OptimizePortfolioTest(PortfolioTestCase):
+    """optimize_portfolio on synthetic close histories (no network)"""
+
+    def setUp(self):
+        super().setUp()
+        pm._opt_cache.clear()
+        pm._history_cache.clear()
+        self.manager._fetch_close_history = self.fake_history
+
+    def fake_history(self, symbol, period):
+        if symbol == 'ZZZZ':  # Unknown to the data source
+            return pd.Series(dtype=np.float64)
+        rng = np.random.default_rng(sum(map(ord, symbol)))
+        index = pd.bdate_range(end='2024-06-28', periods=504)
+        return pd.Series(100 * np.cumprod(1 + rng.normal(0.0008, 0.015, len(index))), index=index)
+
+    def test_unknown_symbol_is_ignored(self):
+        result = self.manager.optimize_portfolio(['AAPL', 'MSFT', 'NVDA', 'GOOG', 'ZZZZ'], target_return=0.2)
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertNotIn('ZZZZ', result['symbols'])
+        self.assertAlmostEqual(sum(result['weights']), 1, places=4)
+
+    def test_too_few_symbols_with_history_fails_cleanly(self):
+        for symbols in (['ZZZZ'], ['AAPL', 'ZZZZ'], []):
+            self.assertEqual(
+                self.manager.optimize_portfolio(symbols, target_return=0.1),
+                {'success': False, 'error': 'Optimization failed'},
+                symbols
+            )
+
+    def test_malformed_arguments_return_error_result(self):
+        for symbols, target_return in ((5, None), (['AAPL', 'MSFT'], [0.1]), (['AAPL', 'MSFT'], 'high')):
+            result = self.manager.optimize_portfolio(symbols, target_return)
+            self.assertFalse(result['success'], (symbols, target_return))
+            self.assertIn('error', result)
+
+
+class OptimizeRouteTest(unittest.TestCase):
+
+    def test_malformed_body_is_rejected(self):
+        client = pm.app.test_client()
+        for body in ({}, {'symbols': []}, {'symbols': 'AAPL'}, {'symbols': ['AAPL', 5]},
+                     {'symbols': ['AAPL', 'MSFT'], 'target_return': 'high'}, ['AAPL']):
+            response = client.post('/api/portfolio/optimize', json=body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertFalse(response.get_json()['success'])
+
+
+class CloseHistoryTest(PortfolioTestCase):
+    """Unknown symbols come back from yfinance as an empty, dateless frame"""
+
+    def setUp(self):
+        super().setUp()
+        pm._opt_cache.clear()
+        pm._history_cache.clear()
+        self.manager._get_ticker = self.fake_ticker
+
+    def fake_ticker(self, symbol):
+        ticker = mock.Mock()
+        if symbol == 'ZZZZ':
+            ticker.history.return_value = yf_utils.empty_df()
+        else:
+            rng = np.random.default_rng(sum(map(ord, symbol)))
+            index = pd.bdate_range(end='2024-06-28', periods=504, tz='America/New_York')
+            ticker.history.return_value = pd.DataFrame(
+                {'Close': 100 * np.cumprod(1 + rng.normal(0.0008, 0.015, len(index)))}, index=index
+            )
+        return ticker
+
+    def test_unknown_symbol_yields_empty_series(self):
+        self.assertTrue(self.manager._fetch_close_history('ZZZZ', '2y').empty)
+
+    def test_unknown_symbol_does_not_sink_optimization(self):
+        result = self.manager.optimize_portfolio(['AAPL', 'MSFT', 'NVDA', 'GOOG', 'ZZZZ'], target_return=0.2)
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertNotIn('ZZZZ', result['symbols'])
+
+
+class WatchlistBulkDeleteRouteTest(unittest.TestCase):
+
+    def test_non_integer_ids_are_rejected(self):
+        client = pm.app.test_client()
+        for ids in ([True], [1, False], ['1'], [1.0], 1):
+            with mock.patch.object(pm.portfolio_manager, 'delete_watchlist_items') as delete:
+                response = client.post('/api/watchlist/bulk_delete', json={'ids': ids})
+            self.assertEqual(response.status_code, 400, ids)
+            delete.assert_not_called()
+
+
+class SchemaMigrationTest(unittest.TestCase):
+    """Databases created before the unique indexes are merged, not rejected, on startup"""
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.db_dir, 'legacy.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript('''
+            CREATE TABLE watchlist (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, target_price REAL,
+                notes TEXT, added_date TEXT, alert_enabled BOOLEAN DEFAULT 1
+            );
+            INSERT INTO watchlist (symbol, target_price, notes, added_date) VALUES
+                ('AAPL', 150, 'earnings play', '2024-01-01'),
+                ('AAPL', NULL, '', '2024-02-01'),
+                ('MSFT', 300, '', '2024-01-01');
+            CREATE TABLE holdings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, portfolio_id INTEGER, symbol TEXT,
+                shares REAL, avg_price REAL, purchase_date TEXT
+            );
+            INSERT INTO holdings (portfolio_id, symbol, shares, avg_price, purchase_date) VALUES
+                (1, 'AAPL', 6, 100, '2024-01-01'),
+                (1, 'AAPL', 2, 200, '2024-02-01'),
+                (1, 'MSFT', 1, 300, '2024-01-01'),
+                (2, 'AAPL', 1, 50, '2024-03-01');
+        ''')
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.db_dir, ignore_errors=True)
+
+    def open_manager(self):
+        manager = pm.PortfolioManager(self.db_path)
+        self.addCleanup(manager._conn().close)
+        return manager
+
+    def test_watchlist_duplicates_are_merged_into_newest_entry(self):
+        with self.assertLogs(pm.logger, 'WARNING'):
+            manager = self.open_manager()
+        rows = manager._conn().execute(
+            'SELECT id, symbol, target_price, notes, added_date FROM watchlist ORDER BY symbol'
+        ).fetchall()
+        self.assertEqual([tuple(row) for row in rows], [
+            (2, 'AAPL', 150.0, 'earnings play', '2024-02-01'),
+            (3, 'MSFT', 300.0, '', '2024-01-01'),
+        ])
+        self.assertEqual(manager._conn().execute('PRAGMA user_version').fetchone()[0], pm.SCHEMA_VERSION)
+
+    def test_holding_duplicates_are_consolidated(self):
+        with self.assertLogs(pm.logger, 'WARNING') as logs:
+            manager = self.open_manager()
+        rows = manager._conn().execute(
+            'SELECT id, portfolio_id, symbol, shares, avg_price FROM holdings ORDER BY id'
+        ).fetchall()
+        self.assertEqual([tuple(row) for row in rows], [
+            (1, 1, 'AAPL', 8.0, 125.0),
+            (3, 1, 'MSFT', 1.0, 300.0),
+            (4, 2, 'AAPL', 1.0, 50.0),
+        ])
+        self.assertTrue(any('1 duplicate holdings rows' in line for line in logs.output))
+
+        # The unique index is in place, so buys fold into the consolidated row
+        manager.add_to_portfolio(1, 'AAPL', 2, 125)
+        self.assertEqual(manager._conn().execute("SELECT COUNT(*) FROM holdings WHERE symbol = 'AAPL'").fetchone()[0], 2)
+
+    def test_migration_runs_once(self):
+        with self.assertLogs(pm.logger, 'WARNING'):
+            self.open_manager()
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('DROP INDEX ux_watchlist_sym')
+        conn.execute("INSERT INTO watchlist (symbol, notes) VALUES ('MSFT', 'later')")
+        conn.commit()
+        conn.close()
+
+        manager = self.open_manager()
+        count = manager._conn().execute("SELECT COUNT(*) FROM watchlist WHERE symbol = 'MSFT'").fetchone()[0]
+        self.assertEqual(count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()